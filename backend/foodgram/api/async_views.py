@@ -0,0 +1,36 @@
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _run_in_worker(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Оборачивает view DRF для работы под ASGI.
+    Синхронные view Django выполняет по одному в общем потоке,
+    поэтому безопасные запросы уходят в пул потоков и обрабатываются
+    параллельно; изменяющие запросы идут прежним путём.
+    """
+    read = sync_to_async(partial(_run_in_worker, view),
+                         thread_sensitive=False)
+    write = sync_to_async(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+from foodgram.db import use_primary
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_KEY = 'auth:token:{}'
+USER_TOKEN_KEY = 'auth:user:{}:token'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшированием пары (пользователь, токен).
+    Запись сбрасывается при удалении токена (выход)
+    и при любом сохранении пользователя: смена пароля, блокировка.
+    Токен проверяется по основной БД: только что выданного
+    на отстающей реплике ещё нет.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = cache.get(TOKEN_KEY.format(key))
+        if cached is not None:
+            return cached
+        with use_primary():
+            user, token = super().authenticate_credentials(key)
+        timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+        cache.set_many({
+            TOKEN_KEY.format(key): (user, token),
+            USER_TOKEN_KEY.format(user.pk): key,
+        }, timeout)
+        return user, token
+
+
+def forget_token(key):
+    cache.delete(TOKEN_KEY.format(key))
+
+
+def forget_user(user_id):
+    key = cache.get(USER_TOKEN_KEY.format(user_id))
+    if key is not None:
+        cache.delete_many(
+            [TOKEN_KEY.format(key), USER_TOKEN_KEY.format(user_id)])
@@ -0,0 +1,173 @@
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from foodgram.db import use_primary
+from recipes.models import Ingredient, Tag
+from rest_framework.response import Response
+
+
+class ReferenceCache:
+    """
+    Справочник (теги, ингредиенты) в памяти процесса.
+    Версия справочника хранится в кэше Django: при общем бэкенде
+    сброс после изменения виден всем воркерам. С локальным кэшем
+    сброс из другого процесса не виден, поэтому копия живёт не
+    дольше REFERENCE_CACHE_TIMEOUT секунд, а промах перечитывает
+    справочник, если объект уже есть в базе.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f'reference:{model._meta.label_lower}:version'
+        self._version = None
+        self._loaded = None
+        self._objects = {}
+        self._data = None
+
+    def __deepcopy__(self, memo):
+        # DRF копирует поля сериализатора вместе с аргументами,
+        # а кэш должен оставаться общим для процесса.
+        return self
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid4().hex, timeout=None)
+            return cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid4().hex, timeout=None)
+
+    def etag(self):
+        return f'"{self.model._meta.model_name}-{self.get_version()}"'
+
+    def is_expired(self):
+        return self._loaded is None or (
+            time.monotonic() - self._loaded
+            > settings.REFERENCE_CACHE_TIMEOUT)
+
+    def load(self, version):
+        # Реплика может отставать, а устаревший справочник
+        # остался бы в памяти до следующего изменения.
+        with use_primary():
+            self._objects = {
+                obj.pk: obj for obj in self.model.objects.order_by('pk')}
+        self._data = None
+        self._version = version
+        self._loaded = time.monotonic()
+
+    def objects(self):
+        version = self.get_version()
+        if version != self._version or self.is_expired():
+            self.load(version)
+        return self._objects
+
+    def exists(self, pk):
+        with use_primary():
+            return self.model.objects.filter(pk=pk).exists()
+
+    def get(self, pk):
+        if pk not in self.objects() and self.exists(pk):
+            self.load(self._version)
+        return self._objects.get(pk)
+
+    def data(self, serializer_class):
+        objects = self.objects()
+        if self._data is None:
+            self._data = serializer_class(
+                list(objects.values()), many=True).data
+        return self._data
+
+
+tags_cache = ReferenceCache(Tag)
+ingredients_cache = ReferenceCache(Ingredient)
+
+
+class FeedCache:
+    """
+    Кэш ответов ленты рецептов для анонимных пользователей.
+    Ключ включает поколения списка, рецепта и справочников:
+    изменение данных меняет поколение, и старые записи
+    просто перестают читаться, без перебора ключей.
+    """
+    list_key = 'feed:list:generation'
+    stats_key = 'feed:stats:{}'
+
+    def recipe_key(self, recipe_id):
+        return f'feed:recipe:{recipe_id}:generation'
+
+    def get_generations(self, *keys):
+        generations = cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                cache.add(key, uuid4().hex, timeout=None)
+                generations[key] = cache.get(key)
+        return [generations[key] for key in keys]
+
+    def invalidate_list(self):
+        cache.set(self.list_key, uuid4().hex, timeout=None)
+
+    def invalidate_recipes(self, recipe_ids):
+        """Сбрасывает поколения после коммита, чтобы не закэшировать
+        данные, которые ещё не видны другим соединениям."""
+        keys = [self.recipe_key(recipe_id) for recipe_id in recipe_ids]
+
+        def invalidate():
+            cache.set_many({key: uuid4().hex for key in keys}, timeout=None)
+            self.invalidate_list()
+
+        transaction.on_commit(invalidate)
+
+    def make_key(self, request, generation_keys):
+        query = sorted(
+            (name, value)
+            for name in request.query_params
+            for value in set(request.query_params.getlist(name)))
+        generations = self.get_generations(*generation_keys)
+        raw = '|'.join([
+            request.get_host(), request.path, repr(query), *generations,
+            tags_cache.get_version(), ingredients_cache.get_version()])
+        return 'feed:response:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def respond(self, request, generation_keys, view):
+        """Отдаёт ответ из кэша или вызывает view и кэширует результат."""
+        if request.user.is_authenticated:
+            return view()
+        key = self.make_key(request, generation_keys)
+        data = cache.get(key)
+        if data is not None:
+            self.count('hits')
+            return Response(data, headers={'X-Cache': 'HIT'})
+        self.count('misses')
+        # Ответ попадёт в кэш для всех, поэтому читаем из основной БД.
+        with use_primary():
+            response = view()
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.FEED_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def count(self, name):
+        key = self.stats_key.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+    def stats(self):
+        hits = cache.get(self.stats_key.format('hits'), 0)
+        misses = cache.get(self.stats_key.format('misses'), 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0,
+        }
+
+
+feed_cache = FeedCache()
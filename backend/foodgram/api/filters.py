@@ -1,8 +1,17 @@
+from django.conf import settings
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Value,
+                              When)
 from django_filters import rest_framework as drf_filters
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.search import search_recipes
+from rest_framework.filters import OrderingFilter
 
 
 class RecipeFilter(drf_filters.FilterSet):
+    """
+    Фильтры рецептов через полусоединения (EXISTS): строки рецептов
+    не размножаются при выборе нескольких тегов и DISTINCT не нужен.
+    """
     is_favorited = drf_filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = drf_filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
@@ -10,7 +19,9 @@ class RecipeFilter(drf_filters.FilterSet):
         field_name="tags__slug",
         to_field_name="slug",
         queryset=Tag.objects.all(),
+        method='filter_tags',
     )
+    search = drf_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -18,22 +29,75 @@ class RecipeFilter(drf_filters.FilterSet):
             'author': ['exact'],
         }
 
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=value)
+        ))
+
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            user = self.request.user
-            return queryset.filter(favorited__user=user)
+            return queryset.filter(Exists(
+                Favorite.objects.filter(
+                    user=self.request.user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            user = self.request.user
-            return queryset.filter(shopping__user=user)
+            return queryset.filter(Exists(
+                ShoppingCart.objects.filter(
+                    user=self.request.user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
 
+class RecipeOrderingFilter(OrderingFilter):
+    """Добавляет id к сортировке, чтобы порядок страниц был стабильным."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {'id', '-id'} & set(ordering):
+            return [*ordering, '-id']
+        return ordering
+
+
 class IngredientFilter(drf_filters.FilterSet):
-    name = drf_filters.CharFilter(field_name='name', lookup_expr='startswith')
+    name = drf_filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+    def filter_name(self, queryset, name, value):
+        """
+        Автодополнение: сначала совпадения по началу названия,
+        затем (для запросов от трёх символов) по вхождению.
+        """
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if len(value) < settings.INGREDIENT_SEARCH_CONTAINS_MIN_LENGTH:
+            return (
+                queryset
+                .filter(name__startswith=value)
+                .order_by('name')[:limit]
+            )
+        return (
+            queryset
+            .filter(name__contains=value)
+            .annotate(
+                rank=Case(
+                    When(name__startswith=value, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField()
+                )
+            )
+            .order_by('rank', 'name')[:limit]
+        )
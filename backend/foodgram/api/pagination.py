@@ -0,0 +1,180 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination,
+                                       replace_query_param)
+from rest_framework.response import Response
+
+SEARCH_CURSOR_ERROR = (
+    'Результаты поиска упорядочены по релевантности и не листаются '
+    'курсором, используйте постраничную пагинацию.')
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсор хранит значения всех полей сортировки, последнее из них — id.
+    Позиция уникальна, поэтому следующая страница выбирается условием
+    по ключу без OFFSET даже при равных favorites_count.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        """Сортировка из ?ordering=, без него — своя по умолчанию."""
+        if request.query_params.get('search', '').strip():
+            raise ValidationError({'pagination': [SEARCH_CURSOR_ERROR]})
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return tuple(ordering)
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = (
+            (self.cursor.reverse, self.cursor.position) if self.cursor
+            else (False, None))
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.after_position(ordering, self.load_position(position)))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = (
+                position is not None, has_following)
+        else:
+            self.has_next, self.has_previous = (
+                has_following, position is not None)
+        if self.has_previous or self.has_next:
+            self.display_page_controls = True
+        return self.page
+
+    def load_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def after_position(ordering, values):
+        """(a, b, id) после позиции: a дальше, либо a равно и b дальше..."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[-1], self.ordering)
+            if self.page else self.cursor.position)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[0], self.ordering)
+            if self.page else self.cursor.position)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(instance[field.lstrip('-')] if isinstance(instance, dict)
+                else getattr(instance, field.lstrip('-')))
+            for field in ordering
+        ])
+
+
+class RecipePagination(PageNumberPagination):
+    """
+    Постраничная пагинация рецептов.
+    С параметром ?pagination=cursor переключается на курсорную
+    по (pub_date, id): без COUNT(*) и OFFSET на глубоких страницах.
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == (
+                self.cursor_mode):
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination:
+    """
+    Keyset-пагинация ленты: курсор хранит (pub_date, id) последнего
+    рецепта, следующая страница читается по индексу без OFFSET.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+        return max(1, min(limit, settings.FEED_MAX_PAGE_SIZE))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, recipe_id = (
+                b64decode(encoded.encode(), validate=True)
+                .decode().split('|'))
+            return datetime.fromisoformat(pub_date), int(recipe_id)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, key):
+        pub_date, recipe_id = key
+        return b64encode(f'{pub_date.isoformat()}|{recipe_id}'.encode())
+
+    def get_paginated_response(self, request, data, next_key):
+        next_link = None
+        if next_key is not None:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), self.cursor_query_param,
+                self.encode_cursor(next_key).decode())
+        return Response({'next': next_link, 'results': data})
@@ -0,0 +1,138 @@
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef, Value
+from recipes.images import select_rendition
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Follow, User
+
+from .cache import ingredients_cache, tags_cache
+from .serializers import (RecipeListSerializer, TagSerializer,
+                          UserSerializer, get_requested_fields)
+
+
+class RecipeProjection:
+    """
+    Сериализация списков рецептов только для чтения: строки .values()
+    и словари-справочники вместо экземпляров моделей и полей DRF.
+    Ответ совпадает с RecipeListSerializer байт в байт.
+    """
+    rendition = 'medium'
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        self.fields = get_requested_fields(
+            request, RecipeListSerializer.Meta.fields)
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def values(self, queryset):
+        """Строки рецептов с теми колонками, что нужны для ответа."""
+        # pub_date и favorites_count нужны курсорной пагинации.
+        columns = ['id', 'author_id', 'name', 'image', 'image_renditions',
+                   'cooking_time', 'pub_date', 'favorites_count']
+        if 'text' in self.fields:
+            columns.append('text')
+        if self.user.is_authenticated:
+            for field, model in (('is_favorited', Favorite),
+                                 ('is_in_shopping_cart', ShoppingCart)):
+                if field in self.fields:
+                    queryset = queryset.annotate(**{field: Exists(
+                        model.objects.filter(
+                            user=self.user, recipe=OuterRef('pk')))})
+                    columns.append(field)
+        return queryset.values(*columns)
+
+    @staticmethod
+    def get_tags_data():
+        return {tag['id']: tag for tag in tags_cache.data(TagSerializer)}
+
+    def get_tags(self, recipe_ids):
+        tags = self.get_tags_data()
+        recipe_tags = defaultdict(list)
+        for recipe_id, tag_id in (
+                Recipe.tags.through.objects
+                .filter(recipe_id__in=recipe_ids)
+                .order_by('tag_id')
+                .values_list('recipe_id', 'tag_id')):
+            # Справочник процесса мог устареть: get() перечитает его.
+            if tag_id not in tags and tags_cache.get(tag_id):
+                tags = self.get_tags_data()
+            recipe_tags[recipe_id].append(tags[tag_id])
+        return recipe_tags
+
+    def get_ingredients(self, recipe_ids):
+        ingredients = ingredients_cache.objects()
+        recipe_ingredients = defaultdict(list)
+        for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects
+                .filter(recipe_id__in=recipe_ids)
+                .order_by('pk')
+                .values_list('recipe_id', 'ingredient_id', 'amount')):
+            ingredient = (ingredients.get(ingredient_id)
+                          or ingredients_cache.get(ingredient_id))
+            recipe_ingredients[recipe_id].append({
+                'id': ingredient_id,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+                'amount': amount,
+            })
+        return recipe_ingredients
+
+    def get_authors(self, author_ids):
+        authors = User.objects.filter(pk__in=author_ids)
+        if self.user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=self.user, author=OuterRef('pk'))))
+        else:
+            authors = authors.annotate(is_subscribed=Value(False))
+        return {
+            author['id']: author
+            for author in authors.values(*UserSerializer.Meta.fields)
+        }
+
+    def get_image(self, row):
+        name = select_rendition(
+            row['image'], row['image_renditions'], self.rendition)
+        name = name or row['image']
+        if not name:
+            return None
+        return self.request.build_absolute_uri(self.storage.url(name))
+
+    def serialize(self, rows):
+        rows = list(rows)
+        recipe_ids = [row['id'] for row in rows]
+        fields = self.fields
+        tags = self.get_tags(recipe_ids) if 'tags' in fields else {}
+        ingredients = (
+            self.get_ingredients(recipe_ids) if 'ingredients' in fields
+            else {})
+        authors = (
+            self.get_authors({row['author_id'] for row in rows})
+            if 'author' in fields else {})
+        getters = {
+            'id': lambda row: row['id'],
+            'tags': lambda row: tags.get(row['id'], []),
+            'author': lambda row: authors[row['author_id']],
+            'ingredients': lambda row: ingredients.get(row['id'], []),
+            'name': lambda row: row['name'],
+            'image': self.get_image,
+            'text': lambda row: row['text'],
+            'cooking_time': lambda row: row['cooking_time'],
+            'is_favorited': lambda row: row.get('is_favorited', False),
+            'is_in_shopping_cart': lambda row: row.get(
+                'is_in_shopping_cart', False),
+        }
+        getters = [(field, getters[field]) for field in fields]
+        return [
+            {field: getter(row) for field, getter in getters}
+            for row in rows
+        ]
+
+    def serialize_ids(self, recipe_ids):
+        """Рецепты в порядке recipe_ids; удалённые пропускаются."""
+        rows = {
+            row['id']: row for row in
+            self.values(Recipe.objects.filter(pk__in=recipe_ids))}
+        return self.serialize(
+            [rows[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in rows])
@@ -0,0 +1,26 @@
+import orjson
+from foodgram.metrics import measure_render
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: тот же компактный UTF-8 вывод, но
+    в несколько раз быстрее. Даты и прочие нестандартные типы
+    по-прежнему приводит кодировщик DRF. Время рендеринга попадает
+    в метрики запроса.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = self.options
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        with measure_render():
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=options)
+        # Как и JSONRenderer, экранируем разделители строк для JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
@@ -1,15 +1,126 @@
 import base64
+import binascii
+import hashlib
+from tempfile import SpooledTemporaryFile
+from uuid import uuid4
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
 from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.fields.files import FieldFile
 from djoser.serializers import UserSerializer
+from recipes.images import get_rendition_name
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.search import update_search_vector
+from recipes.similarity import schedule_similar_recipes
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
 from rest_framework.validators import UniqueTogetherValidator
 from users.models import Follow, User
 
+from .cache import feed_cache, ingredients_cache, tags_cache
+
+SELF_FOLLOW_ERROR = 'Нельзя подписываться на самого себя'
+
+
+def non_field_error(message, code=None):
+    return serializers.ValidationError(
+        {api_settings.NON_FIELD_ERRORS_KEY: [message]}, code=code)
+
+
+def unique_together_error(serializer_class):
+    """Ошибка, которую вернул бы UniqueTogetherValidator сериализатора."""
+    for validator in serializer_class.Meta.validators:
+        if isinstance(validator, UniqueTogetherValidator):
+            return non_field_error(
+                validator.message.format(
+                    field_names=', '.join(validator.fields)),
+                code='unique')
+    raise ValueError(
+        f'{serializer_class.__name__}: нет UniqueTogetherValidator')
+
+
+def get_requested_fields(request, field_names):
+    """
+    Имена полей с учётом ?fields= и ?omit= (через запятую)
+    в исходном порядке. Действует только на чтение.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return list(field_names)
+    only = request.query_params.get('fields')
+    only = set(only.split(',')) if only else None
+    omit = set(request.query_params.get('omit', '').split(','))
+    return [
+        name for name in field_names
+        if (only is None or name in only) and name not in omit
+    ]
+
+
+class SparseFieldsMixin:
+    """
+    Оставляет в ответе только запрошенные поля. Вложенные
+    сериализаторы не затрагиваются: параметры относятся
+    к объектам верхнего уровня.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        return {
+            name: fields[name] for name in
+            get_requested_fields(self.context.get('request'), fields)}
+
+
+def is_same_file(field_file, new_file):
+    """Сравнивает загруженный файл с сохранённым по размеру и хешу."""
+    if not field_file:
+        return False
+    try:
+        if field_file.size != new_file.size:
+            return False
+        digests = []
+        for file in (field_file, new_file):
+            file.open('rb')
+            digest = hashlib.sha256()
+            for chunk in file.chunks():
+                digest.update(chunk)
+            digests.append(digest.digest())
+            file.seek(0)
+    except OSError:
+        return False
+    finally:
+        field_file.close()
+    return digests[0] == digests[1]
+
+
+class ReferenceRelatedField(serializers.PrimaryKeyRelatedField):
+    """Ищет объект по id в кэше справочника, а не запросом к БД."""
+
+    def __init__(self, reference, **kwargs):
+        self.reference = reference
+        kwargs.setdefault('queryset', reference.model.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        obj = self.reference.get(pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
 
 class TagSerializer(serializers.ModelSerializer):
     color = serializers.CharField(required=True)
@@ -19,7 +130,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug')
 
 
-class UserSerializer(UserSerializer):
+class UserSerializer(SparseFieldsMixin, UserSerializer):
     is_subscribed = serializers.BooleanField(default=False, read_only=True)
 
     class Meta:
@@ -31,14 +142,52 @@ class UserSerializer(UserSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Принимает изображение в base64 и отдаёт ссылку на уменьшенную
+    копию rendition, если она уже готова, иначе на оригинал.
+    """
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} МБ.',
+        'invalid_base64': 'Некорректные данные изображения.',
+    }
+    chunk_size = 64 * 1024
+
+    def __init__(self, *args, rendition=None, **kwargs):
+        self.rendition = rendition
+        super().__init__(*args, **kwargs)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            data = self.decode(data)
         return super().to_internal_value(data)
 
+    def decode(self, data):
+        format, sep, imgstr = data.partition(';base64,')
+        if not sep:
+            self.fail('invalid_base64')
+        ext = format.split('/')[-1]
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(imgstr) * 3 // 4 > max_size:
+            self.fail('too_large', max_size=max_size // (1024 * 1024))
+        buffer = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            for start in range(0, len(imgstr), self.chunk_size):
+                buffer.write(base64.b64decode(
+                    imgstr[start:start + self.chunk_size], validate=True))
+        except (binascii.Error, ValueError):
+            buffer.close()
+            self.fail('invalid_base64')
+        buffer.seek(0)
+        return File(buffer, name=f'{uuid4().hex}.{ext}')
+
+    def to_representation(self, value):
+        if self.rendition and value:
+            name = get_rendition_name(value.instance, self.rendition)
+            if name:
+                value = FieldFile(value.instance, value.field, name)
+        return super().to_representation(value)
+
 
 class IngredientSerializer(serializers.ModelSerializer):
 
@@ -48,8 +197,8 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient', queryset=Ingredient.objects.all()
+    id = ReferenceRelatedField(
+        ingredients_cache, source='ingredient'
     )
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -60,12 +209,12 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         read_only=True, many=True, source='recipeingredient_set')
     tags = TagSerializer(read_only=True, many=True)
     author = UserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = Base64ImageField(rendition='full')
     is_favorited = serializers.BooleanField(default=False, read_only=True)
     is_in_shopping_cart = serializers.BooleanField(
         default=False, read_only=True)
@@ -79,8 +228,19 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeListSerializer(RecipeGetSerializer):
+    image = Base64ImageField(rendition='medium')
+
+
+class CookableRecipeSerializer(RecipeListSerializer):
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('missing_count',)
+
+
 class RecipeShortSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = Base64ImageField(rendition='thumbnail')
 
     class Meta:
         model = Recipe
@@ -95,8 +255,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
         read_only=True,
         default=serializers.CurrentUserDefault())
     image = Base64ImageField()
-    tags = serializers.SlugRelatedField(
-        queryset=Tag.objects.all(), slug_field='id', many=True)
+    tags = ReferenceRelatedField(tags_cache, many=True)
 
     class Meta:
         model = Recipe
@@ -106,6 +265,14 @@ class RecipePostSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            'tags',
+        )
         return RecipeGetSerializer(
             instance, context={'request': self.context.get('request')}).data
 
@@ -130,40 +297,84 @@ class RecipePostSerializer(serializers.ModelSerializer):
                     ingredient=ingredient['ingredient'], recipe=recipe,
                     amount=ingredient['amount']))
         RecipeIngredient.objects.bulk_create(ingredients_create)
+        update_search_vector([recipe.pk])
+        schedule_similar_recipes(recipe.pk)
+        ingredient_index.update([recipe.pk])
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        instance.image = validated_data.get('image', instance.image)
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time)
-        ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        ingredients_create = []
-        for ingredient in ingredients:
-            current_ingredient = get_object_or_404(
-                Ingredient,
-                id=ingredient['ingredient'].id
-            )
-            ingredients_create.append(
-                RecipeIngredient(
-                    ingredient=current_ingredient, recipe=instance,
-                    amount=ingredient['amount']
-                )
-            )
-        RecipeIngredient.objects.bulk_create(ingredients_create)
-        instance.save()
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        tags_changed = tags is not None and self.update_tags(instance, tags)
+        ingredients_changed = ingredients is not None and (
+            self.update_ingredients(instance, ingredients))
+        image = validated_data.pop('image', None)
+        if image is not None and not is_same_file(instance.image, image):
+            validated_data['image'] = image
+        changed_fields = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+        if ingredients_changed or {'name', 'text'} & set(changed_fields):
+            update_search_vector([instance.pk])
+        if ingredients_changed or tags_changed:
+            schedule_similar_recipes(instance.pk)
+        if ingredients_changed:
+            ingredient_index.update([instance.pk])
         return instance
 
+    @staticmethod
+    def update_tags(instance, tags):
+        current = {tag.id for tag in instance.tags.all()}
+        new = {tag.id for tag in tags}
+        if current - new:
+            instance.tags.remove(*(current - new))
+        if new - current:
+            instance.tags.add(*(new - current))
+        return current != new
+
+    @staticmethod
+    def update_ingredients(instance, ingredients):
+        current = {
+            item.ingredient_id: item
+            for item in instance.recipeingredient_set.all()
+        }
+        new = {item['ingredient'].id: item['amount'] for item in ingredients}
+        to_create = [
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        ]
+        to_update = []
+        for ingredient_id, amount in new.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                to_update.append(item)
+        to_delete = [
+            item.id for ingredient_id, item in current.items()
+            if ingredient_id not in new
+        ]
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        if to_create or to_update:
+            feed_cache.invalidate_recipes([instance.pk])
+        return bool(to_create or to_update or to_delete)
+
 
 class FollowGetSerializer(UserSerializer):
-    recipes = RecipeShortSerializer(many=True)
-    author = UserSerializer
-    recipes_count = serializers.SerializerMethodField("get_recipes_count")
+    recipes = RecipeShortSerializer(many=True, read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.BooleanField(default=False, read_only=True)
 
     class Meta:
@@ -173,9 +384,6 @@ class FollowGetSerializer(UserSerializer):
             'is_subscribed', 'recipes', 'recipes_count',
         )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.all().count()
-
 
 class FollowSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
@@ -197,8 +405,7 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         if self.context['request'].user == data['author']:
-            raise serializers.ValidationError(
-                'Нельзя подписываться на самого себя')
+            raise serializers.ValidationError(SELF_FOLLOW_ERROR)
         return data
 
 
@@ -221,6 +428,27 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ]
 
 
+class RecipeBatchSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_LIMIT)
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class CookQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.COOK_INGREDIENTS_LIMIT)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.FEED_MAX_PAGE_SIZE,
+        default=settings.REST_FRAMEWORK['PAGE_SIZE'])
+
+
 class ShoppingCartSerializer(serializers.ModelSerializer):
     user = serializers.SlugRelatedField(
         queryset=User.objects.all(),
@@ -1,20 +1,165 @@
-import io
-from collections import defaultdict
+import csv
+import json
 
-from recipes.models import RecipeIngredient
+from django.db import IntegrityError, router, transaction
+from django.db.models import Sum
+from recipes.counters import count_related
+from recipes.models import Favorite, Recipe, RecipeIngredient
 
+SHOPPING_LIST_FORMATS = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
 
-def create_shopping_list(user):
-    lines = []
-    recipe_ingredients = RecipeIngredient.objects.filter(
-        recipe__shopping__user=user)
-    ingredient_totals = defaultdict(int)
 
-    for recipe_ingredient in recipe_ingredients:
-        ingredient = recipe_ingredient.ingredient
-        ingredient_name = f'{ingredient.name} ({ingredient.measurement_unit})'
-        ingredient_totals[ingredient_name] += recipe_ingredient.amount
-    for ingredient_name, amount_sum in ingredient_totals.items():
-        lines.append(f'{ingredient_name} - {amount_sum}\n')
+# Счётчики рецепта, которые зависят от связи пользователь — рецепт.
+RELATION_COUNTERS = {
+    Favorite: 'favorites_count',
+}
 
-    return io.BytesIO(''.join(lines).encode())
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def get_ingredient_totals(user):
+    """Суммирует ингредиенты из корзины одним запросом с GROUP BY."""
+    return (
+        RecipeIngredient
+        .objects
+        .filter(recipe__shopping__user=user)
+        .values('ingredient__name', 'ingredient__measurement_unit')
+        .annotate(total=Sum('amount'))
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def format_txt(row):
+    return (f'{row["ingredient__name"]} '
+            f'({row["ingredient__measurement_unit"]}) - {row["total"]}\n')
+
+
+CSV_WRITER = csv.writer(Echo())
+
+
+def format_csv(row):
+    return CSV_WRITER.writerow((
+        row['ingredient__name'],
+        row['ingredient__measurement_unit'],
+        row['total']))
+
+
+def format_json(row):
+    return json.dumps({
+        'name': row['ingredient__name'],
+        'measurement_unit': row['ingredient__measurement_unit'],
+        'amount': row['total'],
+    }, ensure_ascii=False)
+
+
+# Начало файла, строка ингредиента, разделитель строк, конец файла.
+SHOPPING_LIST_WRITERS = {
+    'txt': ('', format_txt, '', ''),
+    'csv': (CSV_WRITER.writerow(('name', 'measurement_unit', 'amount')),
+            format_csv, '', ''),
+    'json': ('[', format_json, ', ', ']'),
+}
+
+
+def create_shopping_list(user, file_format='txt'):
+    """Возвращает генератор строк списка покупок в выбранном формате."""
+    header, format_row, separator, footer = SHOPPING_LIST_WRITERS[file_format]
+    yield header
+    lead = ''
+    for row in get_ingredient_totals(user).iterator():
+        yield lead + format_row(row)
+        lead = separator
+    yield footer
+
+
+async def acreate_shopping_list(user, file_format='txt'):
+    """
+    Асинхронный вариант для ASGI: строки читаются через async ORM
+    и отдаются по одной, ответ не собирается целиком в памяти.
+    """
+    header, format_row, separator, footer = SHOPPING_LIST_WRITERS[file_format]
+    yield header
+    lead = ''
+    async for row in get_ingredient_totals(user).aiterator():
+        yield lead + format_row(row)
+        lead = separator
+    yield footer
+
+
+def insert_ignore(model, **values):
+    """
+    Вставляет строку без предварительной проверки: уникальность
+    проверяет БД, а нарушение откатывается до точки сохранения.
+    Возвращает True, если строка добавлена, и False при конфликте.
+    Сигналы post_save при этом не отправляются.
+    """
+    try:
+        with transaction.atomic(using=router.db_for_write(model)):
+            model.objects.bulk_create([model(**values)])
+    except IntegrityError:
+        return False
+    return True
+
+
+def sync_relation_counter(model, recipe_ids):
+    """Пересчитывает счётчик рецептов одним UPDATE после пакетной записи."""
+    field = RELATION_COUNTERS.get(model)
+    if field and recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            **{field: count_related(model, 'recipe')})
+
+
+def add_user_recipes(model, user, recipe_ids):
+    """
+    Добавляет рецепты в избранное или корзину пачкой.
+    Возвращает статус для каждого id: created, exists или not_found.
+    """
+    found = set(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True))
+    present = set(
+        model.objects
+        .filter(user=user, recipe__in=found)
+        .values_list('recipe_id', flat=True))
+    created = found - present
+    model.objects.bulk_create(
+        [model(user=user, recipe_id=recipe_id) for recipe_id in created],
+        ignore_conflicts=True)
+    sync_relation_counter(model, created)
+    return {
+        recipe_id: (
+            'created' if recipe_id in created
+            else 'exists' if recipe_id in present
+            else 'not_found')
+        for recipe_id in recipe_ids
+    }
+
+
+def remove_user_recipes(model, user, recipe_ids):
+    """
+    Удаляет рецепты из избранного или корзины одним DELETE.
+    Возвращает статус для каждого id: deleted, absent или not_found.
+    """
+    found = set(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True))
+    relations = model.objects.filter(user=user, recipe__in=found)
+    deleted = set(relations.values_list('recipe_id', flat=True))
+    # На связи ничто не ссылается и сигналов удаления у них нет,
+    # поэтому Django удаляет их одним DELETE без выборки объектов.
+    relations.delete()
+    sync_relation_counter(model, deleted)
+    return {
+        recipe_id: (
+            'deleted' if recipe_id in deleted
+            else 'absent' if recipe_id in found
+            else 'not_found')
+        for recipe_id in recipe_ids
+    }
@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.test import APITestCase
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAA'
+    'AACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImW'
+    'NoAAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FoodgramTestCase(APITestCase):
+    """Пользователи, теги, ингредиенты и рецепты для тестов API."""
+    users_count = 3
+    recipes_count = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@foodgram.ru',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='foodgram-password',
+            )
+            for number in range(cls.users_count)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        ]
+        cls.recipes = [
+            cls.create_recipe(cls.users[number % cls.users_count], number)
+            for number in range(cls.recipes_count)
+        ]
+
+    @classmethod
+    def create_recipe(cls, author, number):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            image='recipes/images/recipe.png',
+            text='Описание',
+            cooking_time=5 + number,
+        )
+        recipe.tags.set(cls.tags[:1 + number % 3])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=cls.ingredients[(number + shift) % 10],
+                amount=shift + 1,
+            )
+            for shift in range(3)
+        )
+        return recipe
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Кэши процесса переживают откат транзакции между тестами.
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def count_queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = method(*args, **kwargs)
+        return response, len(context)
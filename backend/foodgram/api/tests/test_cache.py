@@ -0,0 +1,63 @@
+import time
+from unittest import mock
+
+from api.cache import ingredients_cache, tags_cache
+from django.conf import settings
+from recipes.models import Ingredient, Tag
+
+from .base import PNG, FoodgramTestCase
+
+
+class ReferenceCacheTest(FoodgramTestCase):
+    """Изменения из других процессов не сбрасывают версию в этом."""
+
+    def test_reloads_on_miss_of_existing_object(self):
+        ingredients_cache.objects()
+        # bulk_create не шлёт сигналов, как import_csv в другом процессе.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Новый ингредиент', measurement_unit='г')])
+        ingredient = Ingredient.objects.get(name='Новый ингредиент')
+        self.assertEqual(ingredients_cache.get(ingredient.pk), ingredient)
+        self.assertIsNone(ingredients_cache.get(ingredient.pk + 1))
+
+    def test_recipe_accepts_ingredient_added_elsewhere(self):
+        ingredients_cache.objects()
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Новый ингредиент', measurement_unit='г')])
+        ingredient = Ingredient.objects.get(name='Новый ингредиент')
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post('/api/recipes/', {
+            'ingredients': [{'id': ingredient.pk, 'amount': 2}],
+            'tags': [self.tags[0].pk],
+            'image': PNG,
+            'name': 'Рецепт с новым ингредиентом',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_reloads_after_timeout(self):
+        tags_cache.objects()
+        Tag.objects.filter(pk=self.tags[0].pk).update(name='Переименован')
+        self.assertEqual(tags_cache.get(self.tags[0].pk).name, 'Тег 0')
+        expired = time.monotonic() + settings.REFERENCE_CACHE_TIMEOUT + 1
+        with mock.patch('api.cache.time.monotonic', return_value=expired):
+            self.assertEqual(
+                tags_cache.get(self.tags[0].pk).name, 'Переименован')
+
+
+class FeedCacheTest(FoodgramTestCase):
+
+    def get_first_id(self, query):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/recipes/', query)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0]['id']
+
+    def test_favorites_ordering_is_not_stale(self):
+        query = {'ordering': '-favorites_count'}
+        recipe = self.recipes[0]
+        self.assertNotEqual(self.get_first_id(query), recipe.pk)
+        self.client.force_authenticate(self.users[1])
+        self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(self.get_first_id(query), recipe.pk)
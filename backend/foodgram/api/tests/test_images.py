@@ -0,0 +1,63 @@
+from api.tests.base import PNG, FoodgramTestCase
+from django.test import override_settings
+from recipes.models import Recipe
+
+
+@override_settings(RECIPE_IMAGE_RENDITIONS_ASYNC=False,
+                   SIMILAR_RECIPES_ASYNC=False)
+class RecipeImageTest(FoodgramTestCase):
+    """Загрузка изображения в base64 и ссылки на уменьшенные копии."""
+    recipes_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.users[0])
+
+    def create(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/recipes/', {
+                'ingredients': [
+                    {'id': self.ingredients[0].pk, 'amount': 1}],
+                'tags': [self.tags[0].pk],
+                'image': image,
+                'name': 'Рецепт с фото',
+                'text': 'Описание',
+                'cooking_time': 10,
+            }, format='json')
+
+    def test_invalid_base64(self):
+        for image in ('data:image/png,abc', 'data:image/png;base64,@@@'):
+            with self.subTest(image=image):
+                response = self.create(image)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response.json()['image'],
+                    ['Некорректные данные изображения.'])
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=16)
+    def test_too_large(self):
+        response = self.create(PNG)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('не должен превышать', response.json()['image'][0])
+        self.assertFalse(Recipe.objects.filter(name='Рецепт с фото'))
+
+    def test_renditions(self):
+        response = self.create(PNG)
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        renditions = recipe.image_renditions
+        self.assertEqual(renditions['source'], recipe.image.name)
+        response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertTrue(response.json()['image'].endswith(renditions['full']))
+
+    def test_rendition_fallback(self):
+        recipe = self.recipes[0]
+        outdated = {'source': 'recipes/images/old.png',
+                    'full': 'recipes/images/old_full.jpg'}
+        for renditions in ({}, outdated):
+            with self.subTest(renditions=renditions):
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    image_renditions=renditions)
+                response = self.client.get(f'/api/recipes/{recipe.pk}/')
+                self.assertTrue(
+                    response.json()['image'].endswith(recipe.image.name))
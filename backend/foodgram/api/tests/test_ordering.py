@@ -0,0 +1,61 @@
+from recipes.models import Recipe
+from recipes.search import update_search_vector
+
+from .base import FoodgramTestCase
+
+
+class RecipeOrderingTest(FoodgramTestCase):
+
+    def get_names(self, query):
+        response = self.client.get('/api/recipes/', query)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def get_page(self, url, query=None):
+        response = self.client.get(url, query)
+        self.assertEqual(response.status_code, 200)
+        return (
+            [recipe['name'] for recipe in response.data['results']],
+            response.data['next'], response.data['previous'])
+
+    def test_search_keeps_rank_order(self):
+        first, second = self.recipes[:2]
+        Recipe.objects.filter(pk=first.pk).update(name='Пирог с киви')
+        Recipe.objects.filter(pk=second.pk).update(
+            name='Пирог', text='Начинка из киви')
+        update_search_vector([first.pk, second.pk])
+        self.assertEqual(
+            self.get_names({'search': 'киви'}), ['Пирог с киви', 'Пирог'])
+
+    def test_default_and_requested_ordering(self):
+        newest_first = [recipe.name for recipe in reversed(self.recipes)]
+        self.assertEqual(self.get_names({}), newest_first[:6])
+        self.assertEqual(
+            self.get_names({'pagination': 'cursor'}), newest_first[:6])
+        self.assertEqual(
+            self.get_names({'pagination': 'cursor', 'ordering': 'pub_date'}),
+            [recipe.name for recipe in self.recipes[:6]])
+
+    def test_cursor_with_equal_counters(self):
+        for recipe in self.recipes:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                favorites_count=recipe.pk % 2)
+        expected = list(
+            Recipe.objects
+            .order_by('-favorites_count', '-id')
+            .values_list('name', flat=True))
+        names, next_link, previous_link = self.get_page(
+            '/api/recipes/',
+            {'pagination': 'cursor', 'ordering': '-favorites_count'})
+        self.assertIsNone(previous_link)
+        pages = [names]
+        while next_link:
+            names, next_link, previous_link = self.get_page(next_link)
+            pages.append(names)
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(self.get_page(previous_link)[0], pages[-2])
+
+    def test_cursor_rejects_search(self):
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'search': 'Рецепт'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import override_settings
+from recipes.models import (Favorite, Ingredient, RecipeIngredient,
+                            ShoppingCart)
+from users.models import Follow
+
+from .base import FoodgramTestCase
+
+
+class RecipeProjectionTest(FoodgramTestCase):
+    """Быстрый путь списков отдаёт те же байты, что RecipeListSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        user = cls.users[0]
+        Favorite.objects.create(user=user, recipe=cls.recipes[-1])
+        ShoppingCart.objects.create(user=user, recipe=cls.recipes[-2])
+        Follow.objects.create(user=user, author=cls.users[1])
+
+    def get_content(self, query, projection):
+        # Ответы анонимам кэшируются без учёта настройки.
+        cache.clear()
+        with override_settings(RECIPE_LIST_PROJECTION=projection):
+            response = self.client.get('/api/recipes/', query)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assert_same_content(self, query):
+        self.assertEqual(
+            self.get_content(query, projection=True),
+            self.get_content(query, projection=False))
+
+    def test_same_bytes_as_serializer(self):
+        queries = (
+            {},
+            {'page': 2},
+            {'is_favorited': 1},
+            {'is_in_shopping_cart': 1},
+            {'pagination': 'cursor'},
+            {'fields': 'id,name,author,is_favorited'},
+            {'omit': 'ingredients,text'},
+        )
+        for user in (None, self.users[0]):
+            self.client.force_authenticate(user)
+            for query in queries:
+                with self.subTest(user=user, query=query):
+                    self.assert_same_content(query)
+
+    def test_ingredient_missing_from_process_cache(self):
+        self.client.force_authenticate(self.users[0])
+        self.client.get('/api/recipes/')
+        # Ингредиент добавлен без сигналов, как import_csv в другом процессе.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Новый ингредиент', measurement_unit='г')])
+        ingredient = Ingredient.objects.get(name='Новый ингредиент')
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[-1], ingredient=ingredient, amount=7)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Новый ингредиент'.encode(), response.content)
@@ -0,0 +1,40 @@
+from unittest import mock
+
+from api.pagination import RecipePagination
+from django.test import override_settings
+
+from .base import FoodgramTestCase
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+
+    def get_list(self, page_size):
+        with mock.patch.object(RecipePagination, 'page_size', page_size):
+            response, queries = self.count_queries(
+                self.client.get, '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return queries
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        self.client.force_authenticate(self.users[0])
+        for projection in (True, False):
+            with self.subTest(projection=projection), override_settings(
+                    RECIPE_LIST_PROJECTION=projection):
+                # Первый запрос загружает справочники в память процесса.
+                self.get_list(2)
+                self.assertEqual(self.get_list(2), 5)
+                self.assertEqual(self.get_list(12), 5)
+
+
+class RecipeUpdateQueriesTest(FoodgramTestCase):
+
+    def test_patch_one_field(self):
+        recipe = self.recipes[0]
+        self.client.force_authenticate(recipe.author)
+        response, queries = self.count_queries(
+            self.client.patch, f'/api/recipes/{recipe.pk}/',
+            {'name': 'Новое название'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Новое название')
+        self.assertEqual(queries, 9)
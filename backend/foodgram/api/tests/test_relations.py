@@ -0,0 +1,132 @@
+import threading
+from unittest import skipUnless
+
+from django.db import connection
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITransactionTestCase
+from users.models import Follow, User
+
+from .base import FoodgramTestCase
+
+THREADS = 8
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Параллельные записи SQLite выполняет по очереди')
+class ConcurrentRelationsTest(APITransactionTestCase):
+    """Одновременные одинаковые запросы создают одну связь и +1 к счётчику."""
+
+    def setUp(self):
+        self.user, self.author = (
+            User.objects.create_user(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name='Имя', last_name='Фамилия',
+                password='foodgram-password')
+            for name in ('user', 'author'))
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            image='recipes/images/recipe.png', cooking_time=5,
+            image_renditions={'source': 'recipes/images/recipe.png'})
+        self.recipe.tags.add(
+            Tag.objects.create(name='Тег', slug='tag', color='#000000'))
+
+    def post_concurrently(self, path):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def post():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            try:
+                barrier.wait()
+                statuses.append(client.post(path).status_code)
+            except Exception as error:
+                statuses.append(repr(error))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses, key=str)
+
+    def assert_one_created(self, statuses):
+        self.assertEqual(statuses, [201] + [400] * (THREADS - 1))
+
+    def test_favorite(self):
+        self.assert_one_created(self.post_concurrently(
+            f'/api/recipes/{self.recipe.pk}/favorite/'))
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_shopping_cart(self):
+        self.assert_one_created(self.post_concurrently(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/'))
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+
+    def test_subscribe(self):
+        self.assert_one_created(self.post_concurrently(
+            f'/api/users/{self.author.pk}/subscribe/'))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+
+class RelationBatchTest(FoodgramTestCase):
+
+    def test_batch_delete_favorites(self):
+        user = self.users[0]
+        kept, *removed = self.recipes[:4]
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': [recipe.pk for recipe in self.recipes[:4]]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        recipe_ids = [recipe.pk for recipe in removed] + [10 ** 6]
+        response, queries = self.count_queries(
+            self.client.delete, '/api/recipes/favorite/',
+            {'recipes': recipe_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['deleted'] * len(removed) + ['not_found'])
+        self.assertEqual(queries, 6)
+        self.assertEqual(
+            list(Favorite.objects.values_list('recipe_id', flat=True)),
+            [kept.pk])
+        self.assertEqual(
+            dict(Recipe.objects.filter(pk__in=[kept.pk, *recipe_ids])
+                 .values_list('pk', 'favorites_count')),
+            {kept.pk: 1, **{recipe.pk: 0 for recipe in removed}})
+
+
+class FavoriteCounterTest(FoodgramTestCase):
+    """Удаление избранного без сигналов не оставляет счётчик устаревшим."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        for user in self.users[1:]:
+            self.client.force_authenticate(user)
+            self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+
+    def assert_favorites_count(self, expected):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, expected)
+
+    def test_delete(self):
+        self.assert_favorites_count(2)
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_favorites_count(1)
+
+    def test_delete_user(self):
+        self.users[1].delete()
+        self.assert_favorites_count(1)
@@ -0,0 +1,55 @@
+import json
+from unittest import mock
+
+from api.services import acreate_shopping_list, create_shopping_list
+from asgiref.sync import async_to_sync
+from recipes.models import ShoppingCart
+
+from .base import FoodgramTestCase
+
+
+class ShoppingListTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for recipe in cls.recipes[:4]:
+            ShoppingCart.objects.create(user=cls.users[0], recipe=recipe)
+
+    @staticmethod
+    @async_to_sync
+    async def collect(user, file_format):
+        return [line async for line in acreate_shopping_list(
+            user, file_format)]
+
+    def test_formats(self):
+        user = self.users[0]
+        for file_format in ('txt', 'csv', 'json'):
+            with self.subTest(file_format=file_format):
+                content = ''.join(create_shopping_list(user, file_format))
+                self.assertEqual(
+                    ''.join(self.collect(user, file_format)), content)
+        content = json.loads(''.join(create_shopping_list(user, 'json')))
+        self.assertEqual(len(content), 6)
+        self.assertEqual(content[0], {
+            'name': 'Ингредиент 0', 'measurement_unit': 'г', 'amount': 1})
+
+    def test_async_list_streams_rows(self):
+        fetched = []
+
+        async def rows():
+            for number in range(3):
+                fetched.append(number)
+                yield {'ingredient__name': f'Ингредиент {number}',
+                       'ingredient__measurement_unit': 'г', 'total': 1}
+
+        @async_to_sync
+        async def first_row():
+            lines = acreate_shopping_list(self.users[0], 'json')
+            return [await anext(lines), await anext(lines)]
+
+        totals = mock.Mock(**{'aiterator.return_value': rows()})
+        with mock.patch('api.services.get_ingredient_totals',
+                        return_value=totals):
+            self.assertEqual(first_row()[0], '[')
+        self.assertEqual(fetched, [0])
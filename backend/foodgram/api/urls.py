@@ -1,7 +1,9 @@
+from api.async_views import async_read_view
 from api.views import (UserViewSet,
                        IngredientViewSet, RecipeViewSet,
                        TagViewSet)
-from django.urls import include, path
+from django.conf import settings
+from django.urls import URLPattern, include, path
 from rest_framework.routers import DefaultRouter
 
 app_name = 'api'
@@ -13,8 +15,21 @@ router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'users', UserViewSet, basename='users')
 
-urlpatterns = [
-    path('', include(router.urls)),
-    path('', include('djoser.urls')),
-    path('auth/', include('djoser.urls.authtoken')),
-]
+
+def get_urlpatterns(async_views):
+    """Маршруты API; с async_views чтения идут через async_read_view."""
+    router_urls = router.urls
+    if async_views:
+        router_urls = [
+            URLPattern(pattern.pattern, async_read_view(pattern.callback),
+                       pattern.default_args, pattern.name)
+            for pattern in router_urls
+        ]
+    return [
+        path('', include(router_urls)),
+        path('', include('djoser.urls')),
+        path('auth/', include('djoser.urls.authtoken')),
+    ]
+
+
+urlpatterns = get_urlpatterns(settings.ASYNC_VIEWS)
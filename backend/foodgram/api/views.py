@@ -1,30 +1,51 @@
-from django.db.models import Exists, OuterRef, Q
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Exists, F, OuterRef, Prefetch, Q,
+                              Value, Window)
+from django.db.models.functions import RowNumber
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import UserCreateSerializer, SetPasswordSerializer
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe,
-                            ShoppingCart, Tag)
+from recipes.counters import change_counter
+from recipes.feed import backfill as backfill_feed
+from recipes.feed import get_feed_page
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, SimilarRecipe, Tag)
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from users.models import Follow, User
 
-from .filters import RecipeFilter, IngredientFilter
+from .cache import feed_cache, ingredients_cache, tags_cache
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .pagination import FeedPagination, RecipePagination
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, FollowSerializer,
+from .projections import RecipeProjection
+from .serializers import (SELF_FOLLOW_ERROR, CookableRecipeSerializer,
+                          CookQuerySerializer, FavoriteSerializer,
+                          FollowSerializer, RecipeBatchSerializer,
                           RecipeGetSerializer, IngredientSerializer,
+                          RecipeListSerializer,
                           RecipePostSerializer, RecipeShortSerializer,
                           ShoppingCartSerializer, TagSerializer,
-                          UserSerializer, FollowGetSerializer)
-from .services import create_shopping_list
-from rest_framework.pagination import PageNumberPagination
+                          UserSerializer, FollowGetSerializer,
+                          get_requested_fields, non_field_error,
+                          unique_together_error)
+from .services import (SHOPPING_LIST_FORMATS, acreate_shopping_list,
+                       add_user_recipes, create_shopping_list, insert_ignore,
+                       remove_user_recipes, sync_relation_counter)
 
 
 class UserViewSet(UserViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    # Чтения этих действий ReplicaMiddleware отправляет в реплику.
+    replica_actions = ('list', 'subscriptions')
 
     def get_serializer_class(self):
         if self.action == 'set_password':
@@ -35,7 +56,9 @@ class UserViewSet(UserViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_authenticated:
+        fields = get_requested_fields(
+            self.request, UserSerializer.Meta.fields)
+        if user.is_authenticated and 'is_subscribed' in fields:
             return (
                 User
                 .objects
@@ -50,40 +73,51 @@ class UserViewSet(UserViewSet):
             )
         return User.objects.all()
 
-    @action(['get'], detail=False)
+    @action(['get'], detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        follow = (
-            Follow
+        recipes = Recipe.objects.order_by('-pub_date')
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = (
+                recipes
+                .annotate(
+                    row_number=Window(
+                        RowNumber(),
+                        partition_by=F('author'),
+                        order_by=F('pub_date').desc()
+                    )
+                )
+                .filter(row_number__lte=int(recipes_limit))
+            )
+        authors = (
+            User
             .objects
-            .filter(user=request.user)
-            .prefetch_related('author')
+            .filter(following__user=request.user)
+            .annotate(is_subscribed=Value(True))
+            .order_by('following__id')
         )
-        authors = [follow_obj.author for follow_obj in follow]
-        paginator = PageNumberPagination()
-        paginator.page_size = 6
-        result = paginator.paginate_queryset(authors, request)
+        if 'recipes' in get_requested_fields(
+                request, FollowGetSerializer.Meta.fields):
+            authors = authors.prefetch_related(
+                Prefetch('recipes', queryset=recipes))
+        page = self.paginate_queryset(authors)
         serializer = FollowGetSerializer(
-            result, many=True, context={"user": request.user}
+            page, many=True, context={'request': request}
         )
-        for author_data in serializer.data:
-            author_data["is_subscribed"] = author_data["id"] in (
-                [author.id for author in authors])
-
-        return paginator.get_paginated_response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(methods=['post', 'delete'], detail=True, url_path='subscribe')
+    @transaction.atomic
     def subscribe(self, request, id=None):
         author = get_object_or_404(User, id=id)
         if request.method == 'POST':
-            data = {
-                'user': request.user.id,
-                'author': id,
-            }
-            serializer = FollowSerializer(
-                data=data, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            if author == request.user:
+                raise non_field_error(SELF_FOLLOW_ERROR)
+            if not insert_ignore(Follow, user_id=request.user.id,
+                                 author_id=author.id):
+                raise unique_together_error(FollowSerializer)
+            change_counter(User, author.id, 'followers_count', 1)
+            backfill_feed(request.user.id, author.id)
             return Response(UserSerializer(author).data,
                             status=status.HTTP_201_CREATED)
 
@@ -97,51 +131,124 @@ class UserViewSet(UserViewSet):
 
 class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('favorites_count', 'pub_date')
+    pagination_class = RecipePagination
+    replica_actions = ('list', 'retrieve', 'similar', 'cook')
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PATCH']:
             return RecipePostSerializer
+        if self.action == 'list':
+            return RecipeListSerializer
         return RecipeGetSerializer
 
     def get_queryset(self):
         user = self.request.user
+        fields = set(get_requested_fields(
+            self.request, RecipeGetSerializer.Meta.fields))
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(
+                    Follow
+                    .objects
+                    .filter(user=user, author=OuterRef('pk'))
+                )
+            )
+        prefetches = {
+            'author': Prefetch('author', queryset=authors),
+            'ingredients': Prefetch(
+                'recipeingredient_set',
+                queryset=(
+                    RecipeIngredient
+                    .objects
+                    .select_related('ingredient')
+                    .order_by('pk')
+                )
+            ),
+            'tags': Prefetch('tags', queryset=Tag.objects.order_by('pk')),
+        }
         queryset = (
             Recipe
             .objects
-            .select_related('author')
-            .prefetch_related('ingredients')
-            .prefetch_related('tags')
+            .prefetch_related(*(
+                lookup for field, lookup in prefetches.items()
+                if field in fields
+            ))
         )
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
         if user.is_authenticated:
+            annotations = {
+                'is_favorited': Exists(
+                    Favorite
+                    .objects
+                    .filter(user=user, recipe=OuterRef('pk')
+                            )
+                ),
+                'is_in_shopping_cart': Exists(
+                    ShoppingCart
+                    .objects
+                    .filter(user=user, recipe=OuterRef('pk')
+                            )
+                ),
+            }
             return (
                 queryset
-                .annotate(
-                    is_favorited=Exists(
-                        Favorite
-                        .objects
-                        .filter(user=user, recipe=OuterRef('pk')
-                                )
-                    ),
-                    is_in_shopping_cart=Exists(
-                        ShoppingCart
-                        .objects
-                        .filter(user=user, recipe=OuterRef('pk')
-                                )
-                    )
-                )
+                .annotate(**{
+                    field: annotation
+                    for field, annotation in annotations.items()
+                    if field in fields
+                })
             )
         return queryset
 
-    def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+    def list(self, request, *args, **kwargs):
+        def view():
+            if settings.RECIPE_LIST_PROJECTION:
+                return self.list_projection(request)
+            return super(RecipeViewSet, self).list(request, *args, **kwargs)
 
-    def perform_update(self, serializer):
+        if 'favorites_count' in request.query_params.get('ordering', ''):
+            # Счётчик меняется через update() без сброса поколений,
+            # поэтому такой порядок из кэша был бы устаревшим.
+            return view()
+        return feed_cache.respond(request, [feed_cache.list_key], view)
+
+    def list_projection(self, request):
+        projection = RecipeProjection(request)
+        queryset = projection.values(
+            self.filter_queryset(Recipe.objects.all()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(projection.serialize(queryset))
+        return self.get_paginated_response(projection.serialize(page))
+
+    def serialize_recipes(self, recipe_ids):
+        """Рецепты в порядке recipe_ids в формате списка рецептов."""
+        if settings.RECIPE_LIST_PROJECTION:
+            return RecipeProjection(self.request).serialize_ids(recipe_ids)
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        return RecipeListSerializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True, context=self.get_serializer_context()).data
+
+    def retrieve(self, request, *args, **kwargs):
+        if not kwargs['pk'].isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        return feed_cache.respond(
+            request, [feed_cache.recipe_key(int(kwargs['pk']))],
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs))
+
+    def perform_create(self, serializer):
         serializer.save(author=self.request.user)
-        super(RecipeViewSet, self).perform_update(serializer)
 
     @classmethod
+    @transaction.atomic
     def manage_user_recipe_relations(
             cls, request, pk, queryset, related_field, serializer):
         """
@@ -161,17 +268,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
         if request.method == 'POST':
-            data = {
-                'user': request.user.id,
-                'recipe': pk,
-            }
-            serializer = serializer(data=data, context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(RecipeShortSerializer(
-                get_object_or_404(Recipe, id=pk)).data,
-                status=status.HTTP_201_CREATED
-            )
+            try:
+                recipe = serializer().fields['recipe'].run_validation(pk)
+            except ValidationError as error:
+                raise ValidationError({'recipe': error.detail})
+            if not insert_ignore(queryset.model, user_id=request.user.id,
+                                 recipe_id=recipe.pk):
+                raise unique_together_error(serializer)
+            sync_relation_counter(queryset.model, [recipe.pk])
+            return Response(RecipeShortSerializer(recipe).data,
+                            status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
             recipe = get_object_or_404(Recipe, id=pk)
@@ -180,6 +286,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                 Q(user=request.user)
                                 & Q(recipe=recipe)).delete())
             if del_count:
+                sync_relation_counter(queryset.model, [recipe.pk])
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -196,27 +303,151 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, pk, queryset=ShoppingCart.objects.all(),
             related_field='shopping', serializer=ShoppingCartSerializer)
 
+    @staticmethod
+    @transaction.atomic
+    def manage_user_recipe_batch(request, model):
+        """
+        Добавляет или удаляет список рецептов за один запрос
+        и возвращает результат для каждого id.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            results = add_user_recipes(model, request.user, recipe_ids)
+        else:
+            results = remove_user_recipes(model, request.user, recipe_ids)
+        return Response({'results': [
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in results.items()
+        ]})
+
+    @action(['post', 'delete'], detail=False, url_path='favorite',
+            permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.manage_user_recipe_batch(request, Favorite)
+
+    @action(['post', 'delete'], detail=False, url_path='shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.manage_user_recipe_batch(request, ShoppingCart)
+
+    @action(['get'], detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми."""
+        pagination = FeedPagination()
+        recipe_ids, next_key = get_feed_page(
+            request.user, pagination.get_limit(request),
+            pagination.decode_cursor(request))
+        return pagination.get_paginated_response(
+            request, self.serialize_recipes(recipe_ids), next_key)
+
+    @action(['get'], detail=True)
+    def similar(self, request, pk=None):
+        """Похожие по ингредиентам и тегам рецепты, самые похожие первыми."""
+        if not pk.isdigit():
+            raise Http404
+        recipe_ids = list(
+            SimilarRecipe.objects
+            .filter(recipe_id=pk)
+            .order_by('-score', 'similar_id')
+            .values_list('similar_id', flat=True))
+        if not recipe_ids:
+            get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        return Response(self.serialize_recipes(recipe_ids))
+
     @action(['get'], detail=False)
+    def cook(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов: рецепты
+        по возрастанию числа недостающих ингредиентов.
+        """
+        query = CookQuerySerializer(data={
+            **request.query_params.dict(),
+            'ingredients': request.query_params.getlist('ingredients'),
+        })
+        query.is_valid(raise_exception=True)
+        found = ingredient_index.search(
+            query.validated_data['ingredients'],
+            query.validated_data['limit'],
+            query.validated_data.get('max_missing'))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in found])
+        for recipe_id, missing in found:
+            if recipe_id in recipes:
+                recipes[recipe_id].missing_count = missing
+        serializer = CookableRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _ in found
+             if recipe_id in recipes],
+            many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(['get'], detail=False, permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(feed_cache.stats())
+
+    @action(['get'], detail=False, permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        temp_file = create_shopping_list(request.user)
-        response = FileResponse(temp_file, content_type='text/plain')
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'file_format': [
+                    'Доступные форматы: '
+                    + ', '.join(SHOPPING_LIST_FORMATS)]},
+                status=status.HTTP_400_BAD_REQUEST)
+        create = (acreate_shopping_list if settings.ASYNC_VIEWS
+                  else create_shopping_list)
+        response = StreamingHttpResponse(
+            create(request.user, file_format),
+            content_type=SHOPPING_LIST_FORMATS[file_format])
         response['Content-Disposition'] = (
             'attachment; '
-            'filename=shopping_list.txt'
+            f'filename=shopping_list.{file_format}'
         )
         return response
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class ReferenceCacheMixin:
+    """
+    Отдаёт справочник целиком из кэша процесса
+    и отвечает 304 на If-None-Match с актуальным ETag.
+    """
+    reference = None
+
+    def list(self, request, *args, **kwargs):
+        filterset_class = getattr(self, 'filterset_class', None)
+        if filterset_class and set(request.query_params) & set(
+                filterset_class.base_filters):
+            return super().list(request, *args, **kwargs)
+        etag = self.reference.etag()
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag})
+        return Response(self.reference.data(self.get_serializer_class()),
+                        headers={'ETag': etag})
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs['pk']
+        obj = self.reference.get(int(pk)) if pk.isdigit() else None
+        if obj is None:
+            raise Http404
+        return Response(self.get_serializer(obj).data)
+
+
+class TagViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [IsAdminOrReadOnly]
     pagination_class = None
+    reference = tags_cache
+    replica_actions = ('list', 'retrieve')
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    reference = ingredients_cache
+    replica_actions = ('list', 'retrieve')
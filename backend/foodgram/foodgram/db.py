@@ -0,0 +1,156 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica = ContextVar('replica', default=None)
+
+
+def choose_replica():
+    """Выбирает реплику с учётом весов или None, если реплик нет."""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    aliases, weights = zip(*settings.DATABASE_REPLICAS.items())
+    return random.choices(aliases, weights)[0]
+
+
+@contextmanager
+def use_primary():
+    """Временно направляет чтение в основную БД."""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Читает из реплик только внутри запросов, отмеченных
+    ReplicaMiddleware; всё остальное идёт в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Без явного ответа Django пишет в БД, из которой загружен объект.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Отправляет безопасные запросы к действиям, перечисленным
+    в replica_actions класса view, в одну из реплик. После изменяющего
+    запроса клиент на DATABASE_REPLICA_PIN_SECONDS закрепляется
+    за основной БД, чтобы сразу видеть свои изменения.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    @staticmethod
+    def pin_key(identity):
+        if not identity:
+            return None
+        return 'db:pin:' + hashlib.md5(identity.encode()).hexdigest()
+
+    @classmethod
+    def request_pin_key(cls, request):
+        return cls.pin_key(
+            request.headers.get('Authorization')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+
+    @classmethod
+    def pin(cls, key, response):
+        """
+        Закрепляет клиента за основной БД. Вход (токен в ответе
+        или новая сессия) закрепляет и новую личность клиента:
+        следующий запрос придёт уже с ней.
+        """
+        if response.status_code >= 400:
+            return
+        data = getattr(response, 'data', None)
+        token = data.get('auth_token') if isinstance(data, dict) else None
+        session = response.cookies.get(settings.SESSION_COOKIE_NAME)
+        keys = {
+            key,
+            cls.pin_key(token and f'{TokenAuthentication.keyword} {token}'),
+            cls.pin_key(session and session.value),
+        }
+        cache.set_many(
+            dict.fromkeys(filter(None, keys), True),
+            settings.DATABASE_REPLICA_PIN_SECONDS)
+
+    @staticmethod
+    def reads_from_replica(request, view_func):
+        """Действие ViewSet для метода запроса есть в replica_actions."""
+        replica_actions = getattr(
+            getattr(view_func, 'cls', None), 'replica_actions', ())
+        method = 'get' if request.method == 'HEAD' else request.method
+        action = getattr(view_func, 'actions', {}).get(method.lower())
+        return action in replica_actions
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.choose_view_database(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args,
+                            view_kwargs):
+        self.choose_view_database(request, view_func)
+
+    def choose_view_database(self, request, view_func):
+        replica = getattr(request, 'replica', None)
+        if replica and self.reads_from_replica(request, view_func):
+            _replica.set(replica)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key = self.request_pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            self.pin(key, response)
+            return response
+        pinned = key is not None and cache.get(key, False)
+        request.replica = None if pinned else choose_replica()
+        token = _replica.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _replica.reset(token)
+
+    async def __acall__(self, request):
+        key = self.request_pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            self.pin(key, response)
+            return response
+        pinned = key is not None and await cache.aget(key, False)
+        request.replica = None if pinned else choose_replica()
+        token = _replica.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            _replica.reset(token)
@@ -0,0 +1,214 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)|\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+_stats = ContextVar('request_stats', default=None)
+_lock = threading.Lock()
+_views = {}
+
+
+def fingerprint(sql):
+    """Приводит запрос к виду без значений, чтобы группировать похожие."""
+    return IN_LISTS.sub('(...)', LITERALS.sub('?', sql))
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.fingerprints = Counter()
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if settings.METRICS_QUERY_BUDGET:
+            self.fingerprints[fingerprint(sql)] += 1
+        if settings.METRICS_SLOW_QUERY_MS and (
+                duration * 1000 > settings.METRICS_SLOW_QUERY_MS):
+            logger.warning('Медленный запрос (%.1f мс): %s',
+                           duration * 1000, fingerprint(sql))
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def measure_render():
+    """Добавляет к статистике запроса время рендеринга ответа в байты."""
+    stats = _stats.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.render_time += time.perf_counter() - started
+
+
+def get_view_name(request):
+    """Имя view в виде RecipeViewSet.list или путь к функции."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match._func_path
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if action is None:
+        return view_class.__name__
+    return f'{view_class.__name__}.{action}'
+
+
+def observe(view, stats, duration):
+    with _lock:
+        metrics = _views.setdefault(view, {
+            'buckets': [0] * (len(BUCKETS) + 1),
+            'count': 0,
+            'sum': 0.0,
+            'queries': 0,
+            'db': 0.0,
+            'render': 0.0,
+        })
+        metrics['buckets'][bisect_left(BUCKETS, duration)] += 1
+        metrics['count'] += 1
+        metrics['sum'] += duration
+        metrics['queries'] += stats.queries
+        metrics['db'] += stats.db_time
+        metrics['render'] += stats.render_time
+
+
+def render_metrics():
+    """Метрики в текстовом формате Prometheus."""
+    with _lock:
+        views = {view: {**metrics, 'buckets': list(metrics['buckets'])}
+                 for view, metrics in _views.items()}
+    lines = [
+        '# HELP foodgram_request_duration_seconds Время обработки запроса.',
+        '# TYPE foodgram_request_duration_seconds histogram',
+    ]
+    for view, metrics in sorted(views.items()):
+        total = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), metrics['buckets']):
+            total += count
+            lines.append(
+                'foodgram_request_duration_seconds_bucket'
+                f'{{view="{view}",le="{bound}"}} {total}')
+        lines.append(
+            f'foodgram_request_duration_seconds_sum{{view="{view}"}} '
+            f'{metrics["sum"]}')
+        lines.append(
+            f'foodgram_request_duration_seconds_count{{view="{view}"}} '
+            f'{metrics["count"]}')
+    for name, key, help_text in (
+            ('foodgram_db_queries_total', 'queries', 'Число SQL-запросов.'),
+            ('foodgram_db_duration_seconds_total', 'db',
+             'Время SQL-запросов.'),
+            ('foodgram_render_duration_seconds_total', 'render',
+             'Время рендеринга ответа в JSON.')):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for view, metrics in sorted(views.items()):
+            lines.append(f'{name}{{view="{view}"}} {metrics[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    authorized = request.user.is_staff or bool(token) and (
+        request.headers.get('Authorization') == f'Bearer {token}')
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4')
+
+
+class MetricsMiddleware:
+    """
+    Считает для каждого view число и время SQL-запросов,
+    время рендеринга ответа и общую длительность, добавляет
+    заголовок Server-Timing и копит гистограммы для /api/metrics/.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        duration = time.perf_counter() - stats.started
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.func is metrics_view:
+            return response
+        view = get_view_name(request)
+        observe(view, stats, duration)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};'
+                f'desc="{stats.queries} queries", '
+                f'render;dur={stats.render_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}')
+        budget = settings.METRICS_QUERY_BUDGET
+        if budget and stats.queries > budget:
+            logger.warning(
+                '%s: %s SQL-запросов при бюджете %s\n%s',
+                view, stats.queries, budget,
+                '\n'.join(f'{count} × {sql}' for sql, count
+                          in stats.fingerprints.most_common()))
+        return response
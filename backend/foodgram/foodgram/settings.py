@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -34,7 +35,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.db.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,6 +67,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+# Включается при запуске под ASGI-сервером (uvicorn).
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
 
 DATABASES = {
     'default': {
@@ -75,6 +81,41 @@ DATABASES = {
         'PORT': os.getenv('DB_PORT', default='5432')
     }
 }
+# Реплики для чтения: DB_REPLICAS=host[:port][=вес],...
+DATABASE_REPLICAS = {}
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    address, _, weight = replica.strip().partition('=')
+    host, _, port = address.partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+DATABASE_ROUTERS = ['foodgram.db.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=5))
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default=(
+            'django.core.cache.backends.locmem.LocMemCache' if DEBUG
+            else 'django.core.cache.backends.redis.RedisCache')),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='' if DEBUG else 'redis://redis:6379/0'),
+    }
+}
+# Поколения кэша ленты сбрасываются в кэше, поэтому он должен быть общим
+# для всех воркеров: иначе остальные отдают старые списки до таймаута.
+if not DEBUG and CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    raise ImproperlyConfigured(
+        'Без DEBUG нужен общий для процессов кэш (Redis, Memcached): '
+        'задайте CACHE_BACKEND и CACHE_LOCATION')
+
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', default=300))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=60))
+# Как часто справочники в памяти процесса перечитываются из базы.
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', default=300))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,17 +146,62 @@ STATIC_ROOT = Path(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = Path(BASE_DIR, 'media')
 
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024))
+RECIPE_IMAGE_RENDITIONS = {
+    'thumbnail': (320, 320),
+    'medium': (800, 800),
+    'full': (1600, 1600),
+}
+RECIPE_IMAGE_RENDITIONS_ASYNC = os.getenv('RECIPE_IMAGE_RENDITIONS_ASYNC', 'True') == 'True'
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6
 }
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=20))
+INGREDIENT_SEARCH_CONTAINS_MIN_LENGTH = 3
+RECIPE_BATCH_LIMIT = int(os.getenv('RECIPE_BATCH_LIMIT', default=100))
+# Рецепты авторов с большим числом подписчиков не раскладываются по лентам.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+FEED_MAX_PAGE_SIZE = 50
+# Списки рецептов собираются из .values() без сериализаторов DRF.
+RECIPE_LIST_PROJECTION = os.getenv('RECIPE_LIST_PROJECTION', 'True') == 'True'
+COOK_INGREDIENTS_LIMIT = 50
+# Как часто индекс ингредиентов перечитывает изменения других процессов.
+INGREDIENT_INDEX_TIMEOUT = int(os.getenv('INGREDIENT_INDEX_TIMEOUT', default=300))
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', default=10))
+# Ингредиенты из большего числа рецептов (соль, вода) не делают рецепты похожими.
+SIMILAR_RECIPES_COMMON_LIMIT = int(
+    os.getenv('SIMILAR_RECIPES_COMMON_LIMIT', default=5000))
+# Сколько чужих списков похожих пересчитывать при изменении одного рецепта.
+SIMILAR_RECIPES_UPDATE_LIMIT = int(
+    os.getenv('SIMILAR_RECIPES_UPDATE_LIMIT', default=20))
+SIMILAR_RECIPES_ASYNC = os.getenv('SIMILAR_RECIPES_ASYNC', 'True') == 'True'
+
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'True') == 'True'
+# Токен для /api/metrics/ (Authorization: Bearer <токен>).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+# Логировать запросы к БД сверх бюджета на запрос и медленнее порога, 0 — нет.
+METRICS_QUERY_BUDGET = int(os.getenv('METRICS_QUERY_BUDGET', default=0))
+METRICS_SLOW_QUERY_MS = int(os.getenv('METRICS_SLOW_QUERY_MS', default=0))
+
 DJOSER = {
     'PERMISSIONS': {
         'user_list': ['rest_framework.permissions.AllowAny'],
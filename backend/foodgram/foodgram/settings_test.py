@@ -0,0 +1,9 @@
+from foodgram.settings import *  # noqa: F401,F403
+from foodgram.settings import DATABASES
+
+# Вторая БД без данных основной ведёт себя как сильно отстающая реплика
+# в тестах маршрутизации чтения (foodgram/tests/test_db.py).
+DATABASES['replica_test'] = {
+    **DATABASES['default'],
+    'NAME': f'{DATABASES["default"]["NAME"]}_replica',
+}
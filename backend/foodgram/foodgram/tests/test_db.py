@@ -0,0 +1,61 @@
+from api.tests.base import FoodgramTestCase
+from django.db import DEFAULT_DB_ALIAS
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+# Пустая вторая БД из foodgram.settings_test играет сильно отстающую реплику.
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS={REPLICA: 1})
+class ReplicaRoutingTest(FoodgramTestCase):
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def login(self, user):
+        response = self.client.post('/api/auth/token/login/', {
+            'email': user.email, 'password': 'foodgram-password'})
+        self.assertEqual(response.status_code, 200)
+        return response.data['auth_token']
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.data['count'], 0)
+
+    async def test_async_requests_read_from_replica(self):
+        response = await self.async_client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_other_views_read_from_primary(self):
+        response = self.client.get(f'/api/users/{self.users[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.users[0].pk)
+
+    def test_login_pins_new_token_to_primary(self):
+        token = self.login(self.users[0])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], len(self.users))
+
+    def test_token_checked_against_primary(self):
+        token = Token.objects.create(user=self.users[0])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.users[0].pk)
+        # Без закрепления остальные данные читаются из реплики.
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_write_pins_client_to_primary(self):
+        token = Token.objects.create(user=self.users[0])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        recipe = self.recipes[1]
+        response = self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get('/api/recipes/', {'is_favorited': 1})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [recipe.pk])
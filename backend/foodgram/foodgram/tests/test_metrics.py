@@ -0,0 +1,25 @@
+import re
+
+from api.tests.base import FoodgramTestCase
+from django.test import override_settings
+from foodgram.metrics import render_metrics
+
+TIMING = re.compile(r'(\w+);dur=([\d.]+)')
+
+
+class MetricsTest(FoodgramTestCase):
+
+    def test_server_timing(self):
+        for projection in (True, False):
+            with self.subTest(projection=projection), override_settings(
+                    RECIPE_LIST_PROJECTION=projection):
+                self.client.force_authenticate(self.users[0])
+                response = self.client.get('/api/recipes/')
+                timings = {
+                    name: float(duration) for name, duration in
+                    TIMING.findall(response['Server-Timing'])}
+                self.assertEqual(set(timings), {'db', 'render', 'total'})
+                self.assertLessEqual(timings['render'], timings['total'])
+        self.assertIn(
+            'foodgram_render_duration_seconds_total'
+            '{view="RecipeViewSet.list"}', render_metrics())
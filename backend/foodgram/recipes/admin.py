@@ -1,6 +1,10 @@
+from api.services import sync_relation_counter
 from django.contrib import admin
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.search import search_recipes, update_search_vector
+from recipes.similarity import schedule_similar_recipes
 from users.models import Follow, User
 
 
@@ -11,6 +15,8 @@ class UserAdmin(admin.ModelAdmin):
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = ('username', 'email')
     empty_value_display = '-пусто-'
@@ -23,7 +29,8 @@ class IngredientsInLine(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'text', 'author',
-                    'pub_date', 'get_tags', 'count_favorites')
+                    'pub_date', 'get_tags', 'favorites_count')
+    list_select_related = ('author',)
     search_fields = ('text', 'name')
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
@@ -31,6 +38,20 @@ class RecipeAdmin(admin.ModelAdmin):
         IngredientsInLine,
     ]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('tags')
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_recipes(queryset, search_term.strip()), False
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_vector([form.instance.pk])
+        schedule_similar_recipes(form.instance.pk)
+        ingredient_index.update([form.instance.pk])
+
     def get_tags(self, obj):
         return '\n'.join([p.name for p in obj.tags.all()])
 
@@ -52,6 +73,15 @@ class FollowAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'user')
 
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        sync_relation_counter(Favorite, [obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        sync_relation_counter(Favorite, recipe_ids)
+
 
 @admin.register(ShoppingCart)
 class ShoopingCartAdmin(admin.ModelAdmin):
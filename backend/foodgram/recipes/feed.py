@@ -0,0 +1,180 @@
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.constants import OnConflict
+
+BATCH_SIZE = 5000
+
+
+def _bulk_insert(entries):
+    from recipes.models import FeedEntry
+
+    entries = iter(entries)
+    while batch := list(islice(entries, BATCH_SIZE)):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """
+    Раскладывает новый рецепт по лентам подписчиков автора.
+    Рецепты популярных авторов не раскладываются: их ленты
+    дочитывают при чтении (см. get_feed_page).
+    """
+    from recipes.models import FeedEntry
+    from users.models import Follow
+
+    followers = (
+        Follow.objects
+        .filter(author_id=recipe.author_id,
+                author__followers_count__lte=settings.FEED_FANOUT_LIMIT)
+        .values_list('user_id', flat=True)
+    )
+    _bulk_insert(
+        FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                  author_id=recipe.author_id, pub_date=recipe.pub_date)
+        for user_id in followers.iterator())
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту рецепты автора после подписки на него."""
+    from recipes.models import FeedEntry, Recipe
+
+    recipes = (
+        Recipe.objects
+        .filter(author_id=author_id,
+                author__followers_count__lte=settings.FEED_FANOUT_LIMIT)
+        .values_list('pk', 'pub_date')
+    )
+    _bulk_insert(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                  pub_date=pub_date)
+        for recipe_id, pub_date in recipes.iterator())
+
+
+def fan_out_author(author_id):
+    """
+    Раскладывает все рецепты автора по лентам всех его подписчиков
+    одним INSERT ... SELECT, пропуская уже разложенные. Нужна, когда
+    автор перестаёт быть популярным: рецепты, опубликованные и не
+    добавленные при подписке, пока их дочитывали при чтении, иначе
+    пропали бы из лент.
+    """
+    from recipes.models import FeedEntry, Recipe
+    from users.models import Follow
+
+    ops = connection.ops
+    quote = ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(on_conflict=OnConflict.IGNORE)} '
+            f'{quote(FeedEntry._meta.db_table)} '
+            '(user_id, recipe_id, author_id, pub_date) '
+            'SELECT follow.user_id, recipe.id, recipe.author_id, '
+            'recipe.pub_date '
+            f'FROM {quote(Follow._meta.db_table)} follow '
+            f'JOIN {quote(Recipe._meta.db_table)} recipe '
+            'ON recipe.author_id = follow.author_id '
+            'WHERE follow.author_id = %s AND follow.user_id IS NOT NULL '
+            + ops.on_conflict_suffix_sql(
+                [], OnConflict.IGNORE, None, None),
+            [author_id])
+        return cursor.rowcount
+
+
+def unfollowed(author_id):
+    """
+    Вызывается после уменьшения followers_count. Автор, который
+    только что опустился до FEED_FANOUT_LIMIT, снова раскладывается.
+    """
+    from users.models import User
+
+    if User.objects.filter(
+            pk=author_id,
+            followers_count=settings.FEED_FANOUT_LIMIT).exists():
+        fan_out_author(author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    from recipes.models import FeedEntry
+
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(feed_model, follow_model, recipe_model, user_model):
+    """
+    Заново строит все ленты одним INSERT ... SELECT.
+    Принимает модели, чтобы работать и в миграциях.
+    """
+    quote = connection.ops.quote_name
+    feed_table = quote(feed_model._meta.db_table)
+    feed_model.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {feed_table} '
+            '(user_id, recipe_id, author_id, pub_date) '
+            'SELECT follow.user_id, recipe.id, recipe.author_id, '
+            'recipe.pub_date '
+            f'FROM {quote(follow_model._meta.db_table)} follow '
+            f'JOIN {quote(recipe_model._meta.db_table)} recipe '
+            'ON recipe.author_id = follow.author_id '
+            f'JOIN {quote(user_model._meta.db_table)} author '
+            'ON author.id = follow.author_id '
+            'WHERE follow.user_id IS NOT NULL '
+            'AND author.followers_count <= %s',
+            [settings.FEED_FANOUT_LIMIT])
+        return cursor.rowcount
+
+
+def _before(queryset, key, id_field):
+    if key is None:
+        return queryset
+    pub_date, recipe_id = key
+    return queryset.filter(
+        Q(pub_date__lt=pub_date)
+        | Q(pub_date=pub_date, **{f'{id_field}__lt': recipe_id}))
+
+
+def get_feed_page(user, limit, key=None):
+    """
+    Страница ленты: записи таблицы ленты плюс рецепты популярных
+    авторов, которые читаются напрямую. Возвращает id рецептов
+    (новые первыми) и ключ (pub_date, id) следующей страницы.
+    """
+    from recipes.models import FeedEntry, Recipe
+    from users.models import Follow
+
+    entries = _before(
+        FeedEntry.objects.filter(user=user), key, 'recipe_id')
+    popular = Follow.objects.filter(
+        user=user, author__followers_count__gt=settings.FEED_FANOUT_LIMIT)
+    pulled = _before(
+        Recipe.objects.filter(author__in=popular.values('author')),
+        key, 'id')
+    rows = chain(
+        entries
+        .order_by('-pub_date', '-recipe_id')
+        .values_list('pub_date', 'recipe_id')[:limit + 1],
+        pulled
+        .order_by('-pub_date', '-id')
+        .values_list('pub_date', 'id')[:limit + 1])
+    return _page(sorted(set(rows), reverse=True), limit)
+
+
+def pull_feed_page(user, limit, key=None):
+    """Та же страница ленты, собранная только запросом к рецептам."""
+    from recipes.models import Recipe
+
+    rows = _before(
+        Recipe.objects.filter(author__following__user=user), key, 'id')
+    return _page(
+        list(rows.order_by('-pub_date', '-id')
+             .values_list('pub_date', 'id')[:limit + 1]),
+        limit)
+
+
+def _page(rows, limit):
+    next_key = rows[limit - 1] if len(rows) > limit else None
+    return [recipe_id for _, recipe_id in rows[:limit]], next_key
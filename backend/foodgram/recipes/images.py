@@ -0,0 +1,107 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def rendition_format():
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def get_rendition_name(recipe, rendition):
+    """Путь к уменьшенной копии, если она готова для текущего изображения."""
+    return select_rendition(
+        recipe.image.name, recipe.image_renditions, rendition)
+
+
+def select_rendition(image_name, renditions, rendition):
+    """То же по имени файла и словарю копий, без экземпляра модели."""
+    renditions = renditions or {}
+    if not image_name or renditions.get('source') != image_name:
+        return None
+    return renditions.get(rendition)
+
+
+def render(source, size):
+    image_format, _ = rendition_format()
+    with Image.open(source) as image:
+        image.draft('RGB', size)
+        image = image.convert('RGBA' if image_format == 'WEBP' else 'RGB')
+        image.thumbnail(size)
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=80)
+    return buffer.getvalue()
+
+
+def generate_renditions(recipe_id):
+    """Строит уменьшенные копии изображения рецепта и сохраняет их пути."""
+    from recipes.models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    source_name = recipe.image.name
+    storage = recipe.image.storage
+    previous = recipe.image_renditions or {}
+    _, extension = rendition_format()
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    renditions = {'source': source_name}
+    for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+        with storage.open(source_name) as source:
+            content = render(source, size)
+        renditions[rendition] = storage.save(
+            f'recipes/images/renditions/{stem}_{rendition}.{extension}',
+            ContentFile(content))
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=source_name).update(image_renditions=renditions)
+    # Если изображение успели заменить, устарели только что созданные копии.
+    obsolete, actual = (previous, renditions) if updated else (
+        renditions, previous)
+    for rendition, name in obsolete.items():
+        if rendition != 'source' and name not in actual.values():
+            storage.delete(name)
+
+
+def process_renditions(recipe_id):
+    try:
+        generate_renditions(recipe_id)
+    except Exception:
+        logger.exception('Не удалось обработать изображение рецепта %s',
+                         recipe_id)
+
+
+def _run_in_worker(recipe_id):
+    close_old_connections()
+    try:
+        process_renditions(recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(recipe_id):
+    """
+    Ставит обработку изображения в очередь после коммита транзакции.
+    Без RECIPE_IMAGE_RENDITIONS_ASYNC выполняет её сразу в процессе.
+    """
+
+    def submit():
+        global _executor
+        if not settings.RECIPE_IMAGE_RENDITIONS_ASYNC:
+            process_renditions(recipe_id)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images')
+        _executor.submit(_run_in_worker, recipe_id)
+
+    transaction.on_commit(submit)
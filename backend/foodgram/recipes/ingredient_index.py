@@ -0,0 +1,159 @@
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from foodgram.db import use_primary
+from recipes.models import RecipeIngredient
+
+CHUNK_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class IngredientIndex:
+    """
+    Обратный индекс «ингредиент → отсортированные id рецептов»
+    в памяти процесса. Строится при первом запросе. Изменения
+    рецептов в этом процессе применяются сразу после коммита,
+    изменения из других процессов подхватываются пересборкой
+    раз в INGREDIENT_INDEX_TIMEOUT секунд: она идёт в фоновом
+    потоке, а запросы тем временем читают прежний индекс.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        # Число ингредиентов рецепта по его id.
+        self._sizes = array('H')
+        self._built = None
+        # Изменения, пришедшие во время фоновой пересборки.
+        self._changes = None
+
+    @staticmethod
+    def _grow(sizes, recipe_id):
+        if recipe_id >= len(sizes):
+            sizes.extend(bytes(recipe_id + 1 - len(sizes)))
+
+    def _load(self):
+        postings = defaultdict(lambda: array('l'))
+        sizes = array('H')
+        with use_primary():
+            rows = (
+                RecipeIngredient.objects
+                .order_by('ingredient_id', 'recipe_id')
+                .values_list('ingredient_id', 'recipe_id')
+            )
+            for ingredient_id, recipe_id in rows.iterator(CHUNK_SIZE):
+                postings[ingredient_id].append(recipe_id)
+                self._grow(sizes, recipe_id)
+                sizes[recipe_id] += 1
+        return dict(postings), sizes
+
+    def _rebuild(self):
+        close_old_connections()
+        try:
+            postings, sizes = self._load()
+        except Exception:
+            logger.exception('Не удалось пересобрать индекс ингредиентов')
+            with self._lock:
+                self._changes = None
+            return
+        finally:
+            close_old_connections()
+        with self._lock:
+            changes, self._changes = self._changes, None
+            self._postings, self._sizes = postings, sizes
+            # Пересборка могла прочитать строки до этих коммитов.
+            for recipe_ids, rows in changes:
+                self._apply(recipe_ids, rows)
+            self._built = time.monotonic()
+
+    def _ensure_built(self):
+        if self._built is None:
+            self._postings, self._sizes = self._load()
+            self._built = time.monotonic()
+        elif self._changes is None and (
+                time.monotonic() - self._built
+                > settings.INGREDIENT_INDEX_TIMEOUT):
+            self._changes = []
+            threading.Thread(
+                target=self._rebuild, name='ingredient-index',
+                daemon=True).start()
+
+    def _remove(self, recipe_id):
+        if recipe_id >= len(self._sizes):
+            return
+        left = self._sizes[recipe_id]
+        for postings in self._postings.values():
+            if not left:
+                break
+            position = bisect_left(postings, recipe_id)
+            if position < len(postings) and postings[position] == recipe_id:
+                del postings[position]
+                left -= 1
+        self._sizes[recipe_id] = 0
+
+    def _apply(self, recipe_ids, rows):
+        for recipe_id in recipe_ids:
+            self._remove(recipe_id)
+        for recipe_id, ingredient_id in rows:
+            insort(self._postings.setdefault(
+                ingredient_id, array('l')), recipe_id)
+            self._grow(self._sizes, recipe_id)
+            self._sizes[recipe_id] += 1
+        if self._changes is not None:
+            self._changes.append((recipe_ids, rows))
+
+    def invalidate(self):
+        with self._lock:
+            self._built = None
+
+    def update(self, recipe_ids):
+        """Перечитывает ингредиенты рецептов после коммита."""
+        def apply():
+            with use_primary():
+                rows = list(
+                    RecipeIngredient.objects
+                    .filter(recipe_id__in=recipe_ids)
+                    .values_list('recipe_id', 'ingredient_id'))
+            with self._lock:
+                if self._built is not None:
+                    self._apply(recipe_ids, rows)
+
+        transaction.on_commit(apply)
+
+    def remove(self, recipe_ids):
+        def apply():
+            with self._lock:
+                if self._built is not None:
+                    self._apply(recipe_ids, ())
+
+        transaction.on_commit(apply)
+
+    def search(self, ingredient_ids, limit, max_missing=None):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов,
+        по возрастанию числа недостающих, затем новые первыми.
+        Возвращает пары (id рецепта, недостаёт ингредиентов).
+        """
+        with self._lock:
+            self._ensure_built()
+            found = Counter()
+            for ingredient_id in set(ingredient_ids):
+                found.update(self._postings.get(ingredient_id, ()))
+            ranked = (
+                (self._sizes[recipe_id] - count, -recipe_id)
+                for recipe_id, count in found.items())
+            if max_missing is not None:
+                ranked = (row for row in ranked if row[0] <= max_missing)
+            return [(-recipe_id, missing) for missing, recipe_id
+                    in heapq.nsmallest(limit, ranked)]
+
+
+ingredient_index = IngredientIndex()
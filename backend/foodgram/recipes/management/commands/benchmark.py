@@ -0,0 +1,658 @@
+import asyncio
+import json
+import platform
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import django
+from api.pagination import RecipeCursorPagination
+from api.projections import RecipeProjection
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeListSerializer
+from api.urls import get_urlpatterns
+from api.views import RecipeViewSet
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.models import Count, F, Q
+from django.http import HttpResponse
+from django.test import AsyncClient, Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import include, path
+from recipes.feed import get_feed_page, pull_feed_page
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.pagination import Cursor
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from users.models import Follow, User
+
+from .generate_data import BENCH_PASSWORD
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAA'
+    'AACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImW'
+    'NoAAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+class Scenario:
+    """
+    Один замеряемый запрос. before готовит состояние перед каждым
+    повтором, after убирает последствия, чтобы повторы не влияли
+    друг на друга; их время в замер не входит. function замеряет
+    вызов функции вместо HTTP-запроса; requests — сколько запросов
+    обслуживает один её вызов.
+    """
+
+    def __init__(self, name, path, method='get', data=None,
+                 anonymous=False, before=None, after=None, function=None,
+                 requests=1):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.anonymous = anonymous
+        self.before = before
+        self.after = after
+        self.function = function
+        self.requests = requests
+
+    def get_path(self, state):
+        return self.path(state) if callable(self.path) else self.path
+
+
+def get_urlconf(async_views):
+    """Корневой URLconf с одним API, независимо от ASYNC_VIEWS."""
+    return type('URLConf', (), {'urlpatterns': [
+        path('api/', include((get_urlpatterns(async_views), 'api'))),
+    ]})
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, пропускную способность и число SQL-запросов '
+        'для эндпоинтов API на текущих данных (см. generate_data) '
+        'и выводит результат в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Число потоков для замера пропускной способности '
+                 'читающих эндпоинтов и число синхронных обработчиков '
+                 'в сценариях concurrency.*')
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Число одновременных запросов в сценариях concurrency.*')
+        parser.add_argument(
+            '--only', action='append', default=[],
+            help='Замерять только сценарии, имя которых начинается так')
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс пользователей generate_data, от имени которых '
+                 'идут замеры')
+        parser.add_argument(
+            '--output', default='-', help='Файл для JSON, "-" — stdout')
+        parser.add_argument(
+            '--compare', help='JSON предыдущего запуска для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый относительный рост p50 при сравнении')
+
+    def handle(self, *args, **options):
+        if min(options['iterations'], options['threads'],
+               options['concurrency']) < 1:
+            raise CommandError(
+                '--iterations, --threads и --concurrency должны быть > 0')
+        baseline = self.load(options['compare'])
+        self.prefix = options['prefix']
+        self.threads = options['threads']
+        self.concurrency = options['concurrency']
+        setup_test_environment()
+        try:
+            self.context = self.get_context()
+            self.verify_projection()
+            results = [
+                self.measure(scenario, options)
+                for scenario in self.get_scenarios()
+                if not options['only'] or scenario.name.startswith(
+                    tuple(options['only']))
+            ]
+        finally:
+            teardown_test_environment()
+        report = {'meta': self.get_meta(options), 'results': results}
+        self.write(report, options['output'])
+        if baseline is not None:
+            self.compare(baseline, report, options['threshold'])
+
+    def load(self, path):
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def get_context(self):
+        # Замеры меняют пароль, избранное, корзину и подписки
+        # пользователя, поэтому берутся только созданные generate_data.
+        users = User.objects.filter(username__startswith=f'{self.prefix}_')
+        recipes = Recipe.objects.filter(author__in=users)
+        user = (
+            users
+            .annotate(following_count=Count('follower'))
+            .order_by('-following_count', 'pk')
+            .first()
+        )
+        if user is None or not recipes.exists():
+            raise CommandError(
+                f'Нет пользователей {self.prefix}_* с рецептами: сначала '
+                'выполните manage.py generate_data')
+        user.set_password(BENCH_PASSWORD)
+        user.save(update_fields=['password'])
+        token, _ = Token.objects.get_or_create(user=user)
+        author = users.order_by('-recipes_count', 'pk').first()
+        unfollowed = (
+            users
+            .exclude(pk=user.pk)
+            .exclude(following__user=user)
+            .order_by('-recipes_count', 'pk')
+            .first()
+        )
+        ingredient = Ingredient.objects.order_by('pk').first()
+        recipe = recipes.order_by('-favorites_count', '-pk')[0]
+        return {
+            'user': user,
+            'token': token.key,
+            'author': author,
+            'unfollowed': unfollowed,
+            'recipe': recipe,
+            'pantry': list(
+                recipe.recipeingredient_set
+                .values_list('ingredient_id', flat=True)[1:]
+            ) + [ingredient.pk],
+            'page_ids': list(
+                Recipe.objects.values_list('pk', flat=True)[:50]),
+            'recipe_ids': list(
+                recipes.order_by('-pk').values_list('pk', flat=True)[:20]),
+            'tags': list(Tag.objects.order_by('pk')[:2]),
+            'ingredient': ingredient,
+            'pages': Recipe.objects.count() // 6,
+        }
+
+    @staticmethod
+    def get_cursor_path(ordering, depth):
+        """Ссылка курсорной пагинации на страницу, начинающуюся с depth."""
+        pagination = RecipeCursorPagination()
+        pagination.base_url = '/api/recipes/?pagination=cursor'
+        if ordering != pagination.ordering:
+            pagination.base_url += f'&ordering={ordering[0]}'
+        fields = [field.lstrip('-') for field in ordering]
+        rows = Recipe.objects.order_by(*ordering).values(*fields)[
+            max(0, depth - 1):depth]
+        if not rows:
+            return pagination.base_url
+        return pagination.encode_cursor(Cursor(
+            offset=0, reverse=False,
+            position=pagination._get_position_from_instance(
+                rows[0], ordering)))
+
+    def create_own_recipe(self):
+        # Копии изображения для такого рецепта не нужны.
+        recipe = Recipe.objects.create(
+            author=self.context['user'], name='Замер', text='Замер',
+            image='recipes/images/bench.png', cooking_time=10,
+            image_renditions={'source': 'recipes/images/bench.png'})
+        recipe.tags.set(self.context['tags'])
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.context['ingredient'], amount=1)
+        return recipe
+
+    def delete_recipe(self, response, state):
+        recipe_id = state.pk if state else response.data.get('id')
+        Recipe.objects.filter(pk=recipe_id).delete()
+
+    def get_scenarios(self):
+        context = self.context
+        user = context['user']
+        recipe = context['recipe']
+        tags = context['tags']
+        ingredient = context['ingredient']
+        recipe_data = {
+            'name': 'Замер', 'text': 'Замер', 'cooking_time': 10,
+            'image': IMAGE, 'tags': [tag.pk for tag in tags],
+            'ingredients': [{'id': ingredient.pk, 'amount': 10}],
+        }
+
+        def relation(model, **values):
+            def clear(*args):
+                model.objects.filter(user=user, **values).delete()
+            return clear
+
+        def add_relation(model, **values):
+            def add(*args):
+                model.objects.get_or_create(user=user, **values)
+            return add
+
+        favorite = {'recipe': recipe}
+        batch = {'recipe__in': context['recipe_ids']}
+        tags_query = '&'.join(f'tags={tag.slug}' for tag in tags)
+        deep_offset = context['pages'] // 2 * 6
+        favorites_ordering = ('-favorites_count', '-id')
+        scenarios = [
+            Scenario('recipes.list.anonymous', '/api/recipes/',
+                     anonymous=True),
+            Scenario('recipes.list', '/api/recipes/'),
+            Scenario('recipes.list.deep_page',
+                     f'/api/recipes/?page={max(1, context["pages"] // 2)}'),
+            Scenario('recipes.list.cursor',
+                     '/api/recipes/?pagination=cursor'),
+            # Страница в середине выдачи должна стоить как первая.
+            Scenario('recipes.list.cursor.deep_page',
+                     self.get_cursor_path(
+                         RecipeCursorPagination.ordering, deep_offset)),
+            Scenario('recipes.list.ordering.cursor',
+                     self.get_cursor_path(favorites_ordering, 0)),
+            Scenario('recipes.list.ordering.cursor.deep_page',
+                     self.get_cursor_path(favorites_ordering, deep_offset)),
+            Scenario('recipes.list.fields',
+                     '/api/recipes/?fields=id,name,image,cooking_time'),
+            Scenario('recipes.list.omit',
+                     '/api/recipes/?omit=text,ingredients,author'),
+            Scenario('recipes.list.tags', f'/api/recipes/?{tags_query}'),
+            Scenario('recipes.similar', f'/api/recipes/{recipe.pk}/similar/'),
+            Scenario('recipes.list.author',
+                     f'/api/recipes/?author={context["author"].pk}'),
+            Scenario('recipes.list.is_favorited',
+                     '/api/recipes/?is_favorited=1'),
+            Scenario('recipes.list.is_in_shopping_cart',
+                     '/api/recipes/?is_in_shopping_cart=1'),
+            Scenario('recipes.list.ordering',
+                     '/api/recipes/?ordering=-favorites_count'),
+            Scenario('recipes.list.search', '/api/recipes/?search=рецепт'),
+            Scenario('recipes.retrieve.anonymous',
+                     f'/api/recipes/{recipe.pk}/', anonymous=True),
+            Scenario('recipes.retrieve', f'/api/recipes/{recipe.pk}/'),
+            Scenario('recipes.create', '/api/recipes/', 'post',
+                     recipe_data, after=self.delete_recipe),
+            Scenario('recipes.update',
+                     lambda state: f'/api/recipes/{state.pk}/', 'patch',
+                     {'name': 'Замер 2'}, before=self.create_own_recipe,
+                     after=self.delete_recipe),
+            Scenario('recipes.delete',
+                     lambda state: f'/api/recipes/{state.pk}/', 'delete',
+                     before=self.create_own_recipe),
+            Scenario('recipes.favorite.add',
+                     f'/api/recipes/{recipe.pk}/favorite/', 'post',
+                     before=relation(Favorite, **favorite),
+                     after=relation(Favorite, **favorite)),
+            Scenario('recipes.favorite.remove',
+                     f'/api/recipes/{recipe.pk}/favorite/', 'delete',
+                     before=add_relation(Favorite, **favorite)),
+            Scenario('recipes.favorite.batch', '/api/recipes/favorite/',
+                     'post', {'recipes': context['recipe_ids']},
+                     before=relation(Favorite, **batch),
+                     after=relation(Favorite, **batch)),
+            Scenario('recipes.shopping_cart.add',
+                     f'/api/recipes/{recipe.pk}/shopping_cart/', 'post',
+                     before=relation(ShoppingCart, **favorite),
+                     after=relation(ShoppingCart, **favorite)),
+            Scenario('recipes.shopping_cart.remove',
+                     f'/api/recipes/{recipe.pk}/shopping_cart/', 'delete',
+                     before=add_relation(ShoppingCart, **favorite)),
+            Scenario('recipes.shopping_cart.batch',
+                     '/api/recipes/shopping_cart/', 'post',
+                     {'recipes': context['recipe_ids']},
+                     before=relation(ShoppingCart, **batch),
+                     after=relation(ShoppingCart, **batch)),
+        ]
+        # Лента из таблицы с дочитыванием популярных авторов
+        # против сборки только запросом к рецептам.
+        scenarios += [
+            Scenario('recipes.feed', '/api/recipes/feed/'),
+            Scenario('feed.timeline', 'recipes.feed.get_feed_page',
+                     'call', function=lambda: get_feed_page(user, 6)),
+            Scenario('feed.pull', 'recipes.feed.pull_feed_page', 'call',
+                     function=lambda: pull_feed_page(user, 6)),
+        ]
+        # Затраты CPU на JSON для страницы из 50 рецептов.
+        page = []
+
+        def load_page(*args):
+            if not page:
+                page.extend(self.get_page_data(50))
+
+        renderers = {'json': JSONRenderer(), 'orjson': ORJSONRenderer()}
+        scenarios += [
+            Scenario(f'render.{name}', type(renderer).__name__, 'call',
+                     before=load_page,
+                     function=lambda renderer=renderer: renderer.render(page))
+            for name, renderer in renderers.items()
+        ]
+        # Сериализаторы DRF против сборки из .values(), с запросами к БД;
+        # стоимость одного рецепта — задержка, делённая на 50.
+        view = self.get_list_view(user)
+        page_ids = context['page_ids']
+        scenarios += [
+            Scenario('serialize.drf', 'RecipeListSerializer', 'call',
+                     function=lambda: self.serialize_with_drf(view, page_ids)),
+            Scenario('serialize.projection', 'RecipeProjection', 'call',
+                     function=lambda: RecipeProjection(
+                         view.request).serialize_ids(page_ids)),
+        ]
+        # Обратный индекс в памяти против GROUP BY по связям в БД.
+        pantry = context['pantry']
+        pantry_query = '&'.join(f'ingredients={pk}' for pk in pantry)
+        scenarios += [
+            Scenario('recipes.cook', f'/api/recipes/cook/?{pantry_query}'),
+            Scenario('cook.index', 'recipes.ingredient_index.search', 'call',
+                     function=lambda: ingredient_index.search(pantry, 6)),
+            Scenario('cook.sql', 'RecipeIngredient GROUP BY', 'call',
+                     function=lambda: self.cook_with_sql(pantry, 6)),
+        ]
+        scenarios += [
+            Scenario(f'recipes.download_shopping_cart.{file_format}',
+                     '/api/recipes/download_shopping_cart/'
+                     f'?file_format={file_format}')
+            for file_format in ('txt', 'csv', 'json')
+        ]
+        scenarios += [
+            Scenario('tags.list', '/api/tags/', anonymous=True),
+            Scenario('tags.retrieve', f'/api/tags/{tags[0].pk}/',
+                     anonymous=True),
+            Scenario('ingredients.list', '/api/ingredients/',
+                     anonymous=True),
+            Scenario('ingredients.search.prefix',
+                     f'/api/ingredients/?name={ingredient.name[:2]}',
+                     anonymous=True),
+            Scenario('ingredients.search.contains',
+                     f'/api/ingredients/?name={ingredient.name[-4:]}',
+                     anonymous=True),
+            Scenario('ingredients.retrieve',
+                     f'/api/ingredients/{ingredient.pk}/', anonymous=True),
+            Scenario('users.list', '/api/users/'),
+            Scenario('users.retrieve', f'/api/users/{user.pk}/'),
+            Scenario('users.me', '/api/users/me/'),
+            Scenario('users.subscriptions', '/api/users/subscriptions/'),
+            Scenario('users.subscriptions.recipes_limit',
+                     '/api/users/subscriptions/?recipes_limit=3'),
+            Scenario('auth.token.login', '/api/auth/token/login/', 'post',
+                     {'email': user.email, 'password': BENCH_PASSWORD},
+                     anonymous=True),
+        ]
+
+        def fill_cart(*args):
+            ShoppingCart.objects.bulk_create(
+                [ShoppingCart(user=user, recipe_id=recipe_id)
+                 for recipe_id in context['recipe_ids']],
+                ignore_conflicts=True)
+
+        # Пачка из --concurrency одновременных запросов: --threads
+        # синхронных обработчиков, как у gunicorn с sync-воркерами,
+        # против одного цикла событий ASGI с ASYNC_VIEWS.
+        # Пропускная способность считается по всем запросам пачки.
+        for protocol, run in (('wsgi', self.run_wsgi),
+                              ('asgi', self.run_asgi)):
+            scenarios += [
+                Scenario(f'concurrency.recipes.list.{protocol}',
+                         '/api/recipes/', 'call', requests=self.concurrency,
+                         function=lambda run=run: run('/api/recipes/')),
+                Scenario(f'concurrency.download_shopping_cart.{protocol}',
+                         '/api/recipes/download_shopping_cart/', 'call',
+                         requests=self.concurrency, before=fill_cart,
+                         after=relation(ShoppingCart, **batch),
+                         function=lambda run=run: run(
+                             '/api/recipes/download_shopping_cart/')),
+            ]
+        unfollowed = context['unfollowed']
+        if unfollowed is not None:
+            follow = {'author': unfollowed}
+            scenarios += [
+                Scenario('users.subscribe',
+                         f'/api/users/{unfollowed.pk}/subscribe/', 'post',
+                         before=relation(Follow, **follow),
+                         after=relation(Follow, **follow)),
+                Scenario('users.unsubscribe',
+                         f'/api/users/{unfollowed.pk}/subscribe/', 'delete',
+                         before=add_relation(Follow, **follow)),
+            ]
+        return scenarios
+
+    @staticmethod
+    def get_list_view(user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return RecipeViewSet(
+            request=request, action='list', format_kwarg=None)
+
+    @staticmethod
+    def serialize_with_drf(view, recipe_ids):
+        recipes = view.get_queryset().in_bulk(recipe_ids)
+        return RecipeListSerializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids],
+            many=True, context=view.get_serializer_context()).data
+
+    def verify_projection(self):
+        """Быстрый путь списков должен отдавать те же байты, что DRF."""
+        renderer = ORJSONRenderer()
+        for user in (AnonymousUser(), self.context['user']):
+            view = self.get_list_view(user)
+            recipe_ids = self.context['page_ids']
+            expected = renderer.render(
+                self.serialize_with_drf(view, recipe_ids))
+            actual = renderer.render(
+                RecipeProjection(view.request).serialize_ids(recipe_ids))
+            if actual != expected:
+                raise CommandError(
+                    'RecipeProjection расходится с RecipeListSerializer '
+                    f'для пользователя {user}')
+
+    @staticmethod
+    def get_page_data(size):
+        return RecipeListSerializer(
+            Recipe.objects.order_by('-pub_date')[:size], many=True).data
+
+    @staticmethod
+    def cook_with_sql(ingredient_ids, limit):
+        return list(
+            Recipe.objects
+            .annotate(found=Count(
+                'recipeingredient',
+                filter=Q(recipeingredient__ingredient_id__in=ingredient_ids)))
+            .filter(found__gt=0)
+            .annotate(missing=Count('recipeingredient') - F('found'))
+            .order_by('missing', '-pk')
+            .values_list('pk', 'missing')[:limit])
+
+    def get_client(self, scenario):
+        client = APIClient()
+        if not scenario.anonymous:
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {self.context["token"]}')
+        return client
+
+    def get_headers(self):
+        return {'Authorization': f'Token {self.context["token"]}'}
+
+    def run_wsgi(self, path):
+        # Как воркер gunicorn, каждый поток держит свой обработчик.
+        local = threading.local()
+
+        def get(number):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            try:
+                response = local.client.get(path, headers=self.get_headers())
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                return response.status_code
+            finally:
+                close_old_connections()
+
+        with override_settings(ROOT_URLCONF=get_urlconf(False),
+                               ASYNC_VIEWS=False):
+            with ThreadPoolExecutor(self.threads) as executor:
+                statuses = list(executor.map(get, range(self.concurrency)))
+        self.check_statuses(statuses)
+
+    def run_asgi(self, path):
+        # Заголовки из AsyncClient(headers=...) Django 4.2 теряет.
+        client = AsyncClient()
+
+        async def get():
+            response = await client.get(path, headers=self.get_headers())
+            if response.streaming:
+                async for _ in response.streaming_content:
+                    pass
+            return response.status_code
+
+        async def get_all():
+            return await asyncio.gather(
+                *(get() for _ in range(self.concurrency)))
+
+        with override_settings(ROOT_URLCONF=get_urlconf(True),
+                               ASYNC_VIEWS=True):
+            self.check_statuses(async_to_sync(get_all)())
+
+    @staticmethod
+    def check_statuses(statuses):
+        failed = Counter(status for status in statuses if status != 200)
+        if failed:
+            raise CommandError(f'Запросы пачки завершились с {dict(failed)}')
+
+    def request(self, client, scenario, path):
+        """Возвращает ответ и размер его тела в байтах."""
+        if scenario.function is not None:
+            result = scenario.function()
+            return HttpResponse(), len(result) if isinstance(
+                result, bytes) else 0
+        response = getattr(client, scenario.method)(
+            path, scenario.data, format='json')
+        if response.streaming:
+            return response, len(b''.join(response.streaming_content))
+        return response, len(response.content)
+
+    def measure(self, scenario, options):
+        client = self.get_client(scenario)
+        timings, queries, statuses = [], [], Counter()
+        for number in range(options['warmup'] + options['iterations']):
+            state = scenario.before() if scenario.before else None
+            path = scenario.get_path(state)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response, size = self.request(client, scenario, path)
+                elapsed = time.perf_counter() - started
+            if scenario.after:
+                scenario.after(response, state)
+            if number >= options['warmup']:
+                timings.append(elapsed)
+                queries.append(len(captured.captured_queries))
+                statuses[response.status_code] += 1
+        result = {
+            'name': scenario.name,
+            'method': scenario.method.upper(),
+            'path': path,
+            'status': dict(statuses),
+            'queries': max(queries),
+            'response_bytes': size,
+            'latency_ms': {
+                'min': min(timings) * 1000,
+                'p50': percentile(timings, 0.5) * 1000,
+                'p95': percentile(timings, 0.95) * 1000,
+                'p99': percentile(timings, 0.99) * 1000,
+                'max': max(timings) * 1000,
+                'mean': statistics.fmean(timings) * 1000,
+            },
+            'throughput_rps': (
+                len(timings) * scenario.requests / sum(timings)),
+        }
+        if options['threads'] > 1 and scenario.method == 'get':
+            result['concurrent_throughput_rps'] = self.measure_concurrent(
+                scenario, path, options)
+        self.stderr.write(
+            f'{scenario.name:45} {result["latency_ms"]["p50"]:9.2f} мс '
+            f'{result["queries"]:4} SQL {size:8} Б {dict(statuses)}')
+        return result
+
+    def measure_concurrent(self, scenario, path, options):
+        def worker():
+            client = self.get_client(scenario)
+            try:
+                for _ in range(options['iterations']):
+                    self.request(client, scenario, path)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return options['iterations'] * options['threads'] / elapsed
+
+    def get_meta(self, options):
+        return {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'threads': options['threads'],
+            'rows': {
+                model._meta.label: model.objects.count()
+                for model in (User, Recipe, RecipeIngredient, Follow,
+                              Favorite, ShoppingCart, Ingredient, Tag)
+            },
+        }
+
+    def write(self, report, output):
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if output == '-':
+            self.stdout.write(content)
+            return
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(content + '\n')
+        self.stderr.write(f'Результат записан в {output}')
+
+    def compare(self, baseline, report, threshold):
+        previous = {result['name']: result for result in baseline['results']}
+        regressions = []
+        for result in report['results']:
+            old = previous.get(result['name'])
+            if old is None:
+                continue
+            old_p50 = old['latency_ms']['p50']
+            new_p50 = result['latency_ms']['p50']
+            if new_p50 > old_p50 * (1 + threshold) or (
+                    result['queries'] > old['queries']):
+                regressions.append(
+                    f'{result["name"]}: p50 {old_p50:.2f} → {new_p50:.2f} мс,'
+                    f' SQL {old["queries"]} → {result["queries"]}')
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базового запуска:\n'
+                + '\n'.join(regressions))
+        self.stderr.write('Регрессий не найдено', self.style.SUCCESS)
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from recipes.models import RecipeIngredient
+from recipes.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты по ингредиентам и тегам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--block-size', type=int, default=1000,
+            help='Сколько рецептов обрабатывать и записывать за раз')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = build_similar_recipes(options['block_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожих рецептов: {created}, '
+            f'время: {time.monotonic() - started:.2f} с.'))
+        common = (
+            RecipeIngredient.objects
+            .values('ingredient_id')
+            .annotate(recipes=Count('id'))
+            .filter(recipes__gt=settings.SIMILAR_RECIPES_COMMON_LIMIT)
+            .count())
+        if common:
+            self.stdout.write(self.style.WARNING(
+                f'Не учитываются как слишком частые: {common} ингредиентов '
+                f'(SIMILAR_RECIPES_COMMON_LIMIT='
+                f'{settings.SIMILAR_RECIPES_COMMON_LIMIT})'))
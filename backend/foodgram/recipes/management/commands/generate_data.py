@@ -0,0 +1,233 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from api.cache import feed_cache, ingredients_cache, tags_cache
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.search import update_search_vector
+from users.models import Follow, User
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт масштабный набор данных для замеров производительности: '
+        'пользователей, рецепты, подписки, избранное и корзины '
+        'со степенным распределением популярности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя')
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Среднее число рецептов в избранном у пользователя')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в корзине у пользователя')
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Размер справочника ингредиентов: при миллионе рецептов '
+                 'каждый должен встречаться реже '
+                 'SIMILAR_RECIPES_COMMON_LIMIT раз')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного распределения популярности')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён создаваемых пользователей')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сначала удалить пользователей с этим префиксом')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['batch_size'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и пачка > 0')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        started = time.monotonic()
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=f'{self.prefix}_').delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        tag_ids = self.create_tags(8)
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        user_ids = self.create_users(options['users'])
+        recipe_ids = self.create_recipes(
+            options['recipes'], user_ids, tag_ids, ingredient_ids,
+            options)
+        self.create_relations(
+            Follow, 'author', options['follows'], user_ids, user_ids,
+            options['alpha'])
+        self.create_relations(
+            Favorite, 'recipe', options['favorites'], user_ids, recipe_ids,
+            options['alpha'])
+        self.create_relations(
+            ShoppingCart, 'recipe', options['carts'], user_ids, recipe_ids,
+            options['alpha'])
+        # Пакетная вставка не отправляет сигналы: производные данные
+        # обновляем явно.
+        call_command('recount', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        call_command('build_similar_recipes', stdout=self.stdout)
+        update_search_vector(
+            Recipe.objects.filter(author__in=user_ids).values('pk'))
+        tags_cache.invalidate()
+        ingredients_cache.invalidate()
+        feed_cache.invalidate_list()
+        ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с. '
+            f'Пароль пользователей: {BENCH_PASSWORD}'))
+
+    def bulk_create(self, model, objects, **kwargs):
+        total = 0
+        started = time.monotonic()
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, **kwargs)
+            total += len(batch)
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(
+            f'{model._meta.label}: {total} строк ({rate:.0f} строк/с)')
+
+    def power_law(self, size, alpha):
+        """Накопленные веса, при которых популярность убывает по Ципфу."""
+        ranks = list(range(1, size + 1))
+        self.rng.shuffle(ranks)
+        return list(accumulate(rank ** -alpha for rank in ranks))
+
+    def create_tags(self, count):
+        existing = list(Tag.objects.values_list('id', flat=True))
+        if len(existing) < count:
+            colors = set(Tag.objects.values_list('color', flat=True))
+            names = set(Tag.objects.values_list('name', flat=True))
+            new_tags = []
+            for number in range(count * 4):
+                color = f'#{number * 0x2f1b3 % 0xffffff:06x}'
+                name = f'{self.prefix}-tag-{number}'
+                if color in colors or name in names:
+                    continue
+                new_tags.append(Tag(name=name, slug=name, color=color))
+                if len(existing) + len(new_tags) == count:
+                    break
+            self.bulk_create(Tag, new_tags)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_ingredients(self, count):
+        if Ingredient.objects.count() < count:
+            self.bulk_create(
+                Ingredient,
+                (Ingredient(name=f'{self.prefix} ингредиент {number}',
+                            measurement_unit='г')
+                 for number in range(count)),
+                ignore_conflicts=True)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        existing = User.objects.filter(
+            username__startswith=f'{self.prefix}_').count()
+        password = make_password(BENCH_PASSWORD)
+        self.bulk_create(User, (
+            User(username=f'{self.prefix}_{number}',
+                 email=f'{self.prefix}_{number}@example.com',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for number in range(existing, count)))
+        return list(
+            User.objects
+            .filter(username__startswith=f'{self.prefix}_')
+            .order_by('pk')
+            .values_list('pk', flat=True))
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                       options):
+        authors = self.power_law(len(user_ids), options['alpha'])
+        now = timezone.now()
+        pub_date = Recipe._meta.get_field('pub_date')
+        recipe_ids = []
+        started = time.monotonic()
+        # auto_now_add перезаписал бы даты при вставке,
+        # а ленте нужны публикации, растянутые во времени.
+        pub_date.auto_now_add = False
+        try:
+            for batch in batched(range(count), self.batch_size):
+                recipes = Recipe.objects.bulk_create([
+                    Recipe(
+                        author_id=author_id,
+                        name=f'Рецепт {number}',
+                        text=f'Описание рецепта {number}',
+                        image='recipes/images/bench.png',
+                        cooking_time=self.rng.randint(5, 180),
+                        pub_date=now - timedelta(
+                            minutes=self.rng.randint(0, 525600)))
+                    for number, author_id in zip(batch, self.rng.choices(
+                        user_ids, cum_weights=authors, k=len(batch)))
+                ])
+                self.create_recipe_relations(
+                    recipes, tag_ids, ingredient_ids, options)
+                recipe_ids.extend(recipe.pk for recipe in recipes)
+                self.stdout.write(f'Рецептов: {len(recipe_ids)}')
+        finally:
+            pub_date.auto_now_add = True
+        self.stdout.write(
+            f'Рецепты созданы за {time.monotonic() - started:.1f} с')
+        return recipe_ids
+
+    def create_recipe_relations(self, recipes, tag_ids, ingredient_ids,
+                                options):
+        tags_count = min(options['tags_per_recipe'], len(tag_ids))
+        ingredients_count = min(
+            options['ingredients_per_recipe'], len(ingredient_ids))
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in self.rng.sample(tag_ids, tags_count)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                             amount=self.rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient_id in self.rng.sample(
+                ingredient_ids, ingredients_count)
+        ])
+
+    def create_relations(self, model, field, average, user_ids, target_ids,
+                         alpha):
+        """Связи пользователь — цель, популярные цели выбираются чаще."""
+        if not average or not target_ids:
+            return
+        weights = self.power_law(len(target_ids), alpha)
+
+        def relations():
+            for user_id in user_ids:
+                count = min(self.rng.randint(0, 2 * average),
+                            len(target_ids) - 1)
+                targets = set(self.rng.choices(
+                    target_ids, cum_weights=weights, k=count))
+                targets.discard(user_id if model is Follow else None)
+                for target_id in targets:
+                    yield model(user_id=user_id, **{f'{field}_id': target_id})
+
+        self.bulk_create(model, relations(), ignore_conflicts=True)
@@ -1,20 +1,170 @@
 import csv
+import json
+import re
+import sys
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from api.cache import ingredients_cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from recipes.models import Ingredient
 
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+JSON_CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json(file, chunk_size=None):
+    """
+    Записи JSON-массива верхнего уровня или JSON Lines по одной.
+    Файл читается кусками, в памяти только текущий кусок.
+    """
+    chunk_size = chunk_size or JSON_CHUNK_SIZE
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+    eof = need_more = closed = expect_separator = False
+    array = None
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if need_more or position == len(buffer):
+            if eof:
+                break
+            chunk = file.read(chunk_size)
+            buffer, position = buffer[position:] + chunk, 0
+            eof, need_more = not chunk, False
+            continue
+        char = buffer[position]
+        if closed:
+            raise json.JSONDecodeError(
+                'Лишние данные после массива', buffer, position)
+        if array is None:
+            array = char == '['
+            position += array
+            continue
+        if array and (expect_separator or char == ']'):
+            if char == ']':
+                closed = True
+            elif char != ',':
+                raise json.JSONDecodeError(
+                    'Ожидается "," или "]"', buffer, position)
+            position += 1
+            expect_separator = False
+            continue
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            need_more = True
+            continue
+        if end == len(buffer) and not eof:
+            need_more = True
+            continue
+        position = end
+        expect_separator = array
+        yield record
+    if array and not closed:
+        raise json.JSONDecodeError('Массив не закрыт', buffer, position)
+
 
 class Command(BaseCommand):
-    help = 'Импортирует данные из csv файлов'
+    help = (
+        'Импортирует ингредиенты из csv-, json- или jsonl-файлов пачками. '
+        'Повторный запуск не создаёт дублей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['./data/ingredients.csv'],
+            help='Файлы для импорта, "-" — стандартный ввод')
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файлов: json — массив или JSON Lines '
+                 '(по умолчанию — по расширению, для стандартного '
+                 'ввода — csv)')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер пачки для bulk_create')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только прочитать и проверить данные, ничего не записывая')
 
     def handle(self, *args, **options):
-        with open(
-            './data/ingredients.csv',
-             encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                name = row['name']
-                measurement_unit = row['measurement_unit']
-                Ingredient(
-                    name=name,
-                    measurement_unit=measurement_unit).save()
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        total = 0
+        with transaction.atomic():
+            for path in options['paths']:
+                rows = self.read_rows(path, options['format'])
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    total += len(batch)
+                    if not options['dry_run']:
+                        Ingredient.objects.bulk_create(
+                            [Ingredient(name=name, measurement_unit=unit)
+                             for name, unit in dict.fromkeys(batch)],
+                            ignore_conflicts=True)
+                    self.report(total, started)
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Проверено строк: {total}. Данные не записывались.'))
+            return
+        ingredients_cache.invalidate()
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {total}, добавлено ингредиентов: {created}, '
+            f'время: {time.monotonic() - started:.2f} с.'))
+
+    def report(self, total, started):
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(f'{total} строк ({rate:.0f} строк/с)')
+
+    def read_rows(self, path, file_format):
+        if file_format is None:
+            file_format = (
+                'json' if path.endswith(('.json', '.jsonl')) else 'csv')
+        if path == '-':
+            yield from self.parse(sys.stdin, file_format, '<stdin>')
+            return
+        try:
+            with open(path, encoding='utf-8') as file:
+                yield from self.parse(file, file_format, path)
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть {path}: {error}')
+
+    def parse(self, file, file_format, path):
+        if file_format == 'json':
+            records = iter_json(file)
+        else:
+            records = csv.DictReader(file, delimiter=',')
+        number = 0
+        try:
+            for number, record in enumerate(records, start=1):
+                yield self.clean(record, path, number)
+        except json.JSONDecodeError as error:
+            raise CommandError(
+                f'{path}, после записи {number}: некорректный JSON: {error}')
+
+    @staticmethod
+    def clean(record, path, number):
+        try:
+            name = record['name'].strip()
+            unit = record['measurement_unit'].strip()
+        except (KeyError, AttributeError, TypeError):
+            raise CommandError(
+                f'{path}, запись {number}: ожидаются поля '
+                'name и measurement_unit')
+        if not name or not unit or len(name) > NAME_LENGTH or (
+                len(unit) > UNIT_LENGTH):
+            raise CommandError(
+                f'{path}, запись {number}: некорректное значение '
+                f'{name!r}, {unit!r}')
+        return name, unit
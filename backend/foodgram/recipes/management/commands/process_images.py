@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии изображений рецептов, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии для всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        processed = 0
+        for recipe in recipes.only('id', 'image', 'image_renditions'):
+            renditions = recipe.image_renditions or {}
+            if options['all'] or renditions.get('source') != (
+                    recipe.image.name):
+                generate_renditions(recipe.pk)
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}'))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.feed import rebuild
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = 'Заново строит ленты подписок по текущим подпискам и рецептам'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = rebuild(FeedEntry, Follow, Recipe, User)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {created}, '
+            f'время: {time.monotonic() - started:.2f} с.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.counters import recount
+from recipes.models import Favorite, Recipe
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и исправляет расхождения'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        counters = (
+            (Recipe, 'favorites_count', Favorite, 'recipe'),
+            (User, 'recipes_count', Recipe, 'author'),
+            (User, 'followers_count', Follow, 'author'),
+        )
+        for model, field, related_model, related_field in counters:
+            fixed = recount(model, field, related_model, related_field)
+            self.stdout.write(
+                f'{model._meta.model_name}.{field}: исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:06
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+def create_trigram_index(apps, schema_editor):
+    """GIN-индекс pg_trgm для поиска по вхождению (только PostgreSQL)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                'CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                'CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx '
+                'ON recipes_ingredient USING gin (name gin_trgm_ops)')
+    except DatabaseError:
+        # Нет прав на создание расширения: остаётся префиксный индекс.
+        pass
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS ingredient_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:07
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает дубли (name, measurement_unit), оставляя ингредиент с min id."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra_ids = list(
+            Ingredient.objects
+            .filter(name=duplicate['name'],
+                    measurement_unit=duplicate['measurement_unit'])
+            .exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+        recipes_with_kept = RecipeIngredient.objects.filter(
+            ingredient_id=keep_id).values('recipe_id')
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=extra_ids,
+            recipe_id__in=recipes_with_kept).delete()
+        for recipe_ingredient in RecipeIngredient.objects.filter(
+                ingredient_id__in=extra_ids).order_by('id'):
+            if RecipeIngredient.objects.filter(
+                    recipe_id=recipe_ingredient.recipe_id,
+                    ingredient_id=keep_id).exists():
+                recipe_ingredient.delete()
+                continue
+            recipe_ingredient.ingredient_id = keep_id
+            recipe_ingredient.save(update_fields=['ingredient'])
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_ingredient_name_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from colorfield.fields import ColorField
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -22,6 +23,14 @@ class Ingredient(models.Model):
         help_text='Введите название ингредиента')
     measurement_unit = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [models.Index(fields=['name'],
+                                name='ingredient_name_prefix_idx',
+                                opclasses=['varchar_pattern_ops'])]
+        constraints = [models.UniqueConstraint(
+            fields=['name', 'measurement_unit'],
+            name='unique_ingredient_unit')]
+
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
@@ -38,6 +47,9 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images/',
     )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии изображения', default=dict,
+        blank=True, editable=False)
     text = models.TextField(
         'Текстовое описание',
         help_text='Напишите ваш рецепт')
@@ -60,17 +72,74 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
-
-    def count_favorites(self):
-        return self.favorited.count()
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class FeedEntry(models.Model):
+    """Запись ленты: рецепт автора, на которого подписан пользователь."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель ленты')
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта')
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'recipe'],
+                                               name='unique_feed_entry')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+
+class SimilarRecipe(models.Model):
+    """Заранее посчитанный похожий рецепт и мера сходства."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт')
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['recipe', 'similar'],
+                                               name='unique_similar_recipe')]
+        indexes = [models.Index(fields=['recipe', '-score'],
+                                name='similar_recipe_score_idx')]
+
+
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
@@ -0,0 +1,78 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef, Q,
+                              Subquery, Value, When)
+
+SEARCH_CONFIG = 'russian'
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def build_search_vector(recipe_ingredient_model):
+    """Вектор с весами: название — A, описание — B, ингредиенты — C."""
+    ingredient_names = Subquery(
+        recipe_ingredient_model.objects
+        .filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names, weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(recipes):
+    """Пересчитывает вектор для рецептов (queryset или список id)."""
+    from recipes.models import Recipe, RecipeIngredient
+
+    if not is_postgresql():
+        return
+    (
+        Recipe.objects
+        .filter(pk__in=recipes)
+        .update(search_vector=build_search_vector(RecipeIngredient))
+    )
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск с ранжированием. На других СУБД —
+    поиск по вхождению с приоритетом совпадений в названии.
+    """
+    from recipes.models import RecipeIngredient
+
+    if is_postgresql():
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            queryset
+            .filter(search_vector=search_query)
+            .annotate(
+                search_rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-search_rank', '-pub_date', '-id')
+        )
+    in_ingredients = Exists(
+        RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=query))
+    return (
+        queryset
+        .filter(Q(name__icontains=query) | Q(text__icontains=query)
+                | in_ingredients)
+        .annotate(
+            search_rank=Case(
+                When(name__icontains=query, then=Value(2)),
+                When(text__icontains=query, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+        .order_by('-search_rank', '-pub_date', '-id')
+    )
@@ -0,0 +1,64 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from users.models import User
+
+from .counters import change_counter
+from .feed import fan_out
+from .images import schedule_renditions
+from .ingredient_index import ingredient_index
+from .models import Favorite, Ingredient, Recipe
+from .search import update_search_vector
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    renditions = instance.image_renditions or {}
+    if instance.image and renditions.get('source') != instance.image.name:
+        schedule_renditions(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        fan_out(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(sender, instance, **kwargs):
+    ingredient_index.remove([instance.pk])
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+# У Favorite нет сигналов удаления, чтобы пакетное удаление шло одним
+# DELETE; счётчик пересчитывают те, кто удаляет. Каскад при удалении
+# пользователя уменьшает счётчики заранее.
+@receiver(pre_delete, sender=User)
+def decrement_user_favorites_count(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        pk__in=Favorite.objects.filter(user=instance).values('recipe_id'),
+        favorites_count__gt=0,
+    ).update(favorites_count=F('favorites_count') - 1)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(
+            Recipe.objects.filter(ingredients=instance).values('pk'))
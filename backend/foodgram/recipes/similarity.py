@@ -0,0 +1,251 @@
+import heapq
+import logging
+import math
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 10000
+DELETE_BATCH_SIZE = 500
+
+_executor = None
+
+
+def score(shared, size, other_size):
+    """Косинус бинарных векторов рецептов (ингредиенты и теги)."""
+    return shared / math.sqrt(size * other_size)
+
+
+def top_similar(candidates, size, limit):
+    """candidates: (id, общих признаков, признаков у кандидата)."""
+    return heapq.nlargest(
+        limit,
+        ((score(shared, size, other_size), other_id)
+         for other_id, shared, other_size in candidates))
+
+
+class SimilarityIndex:
+    """
+    Разреженные векторы всех рецептов в памяти процесса:
+    списки рецептов по ингредиентам и маски тегов. Ингредиенты,
+    которые встречаются почти везде, в совпадениях не учитываются —
+    иначе каждый рецепт сравнивался бы с половиной базы.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(lambda: array('l'))
+        self.tags = {}
+        self.sizes = Counter()
+
+    def load(self):
+        ingredients = (
+            RecipeIngredient.objects
+            .order_by()
+            .values_list('recipe_id', 'ingredient_id')
+        )
+        for recipe_id, ingredient_id in ingredients.iterator(CHUNK_SIZE):
+            self.postings[ingredient_id].append(recipe_id)
+            self.sizes[recipe_id] += 1
+        tags = (
+            Recipe.tags.through.objects
+            .order_by()
+            .values_list('recipe_id', 'tag_id')
+        )
+        for recipe_id, tag_id in tags.iterator(CHUNK_SIZE):
+            self.tags[recipe_id] = self.tags.get(recipe_id, 0) | 1 << tag_id
+            self.sizes[recipe_id] += 1
+        return self
+
+    def candidates(self, recipe_id, ingredient_ids):
+        shared = Counter()
+        for ingredient_id in ingredient_ids:
+            postings = self.postings.get(ingredient_id, ())
+            if len(postings) <= settings.SIMILAR_RECIPES_COMMON_LIMIT:
+                shared.update(postings)
+        shared.pop(recipe_id, None)
+        tags = self.tags.get(recipe_id, 0)
+        for other_id, count in shared.items():
+            other_tags = self.tags.get(other_id, 0)
+            yield (other_id, count + (tags & other_tags).bit_count(),
+                   self.sizes[other_id])
+
+
+def build_similar_recipes(block_size=1000):
+    """
+    Пересчитывает таблицу похожих рецептов блоками по block_size:
+    в памяти держится только индекс и один блок результатов.
+    """
+    index = SimilarityIndex().load()
+    recipe_ids = (
+        Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        .iterator(CHUNK_SIZE)
+    )
+    total = 0
+    while block := list(islice(recipe_ids, block_size)):
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in (
+                RecipeIngredient.objects
+                .filter(recipe_id__in=block)
+                .values_list('recipe_id', 'ingredient_id')):
+            ingredients[recipe_id].append(ingredient_id)
+        rows = [
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other_id,
+                          score=similarity)
+            for recipe_id in block
+            for similarity, other_id in top_similar(
+                index.candidates(recipe_id, ingredients[recipe_id]),
+                index.sizes[recipe_id], settings.SIMILAR_RECIPES_COUNT)
+        ]
+        with transaction.atomic():
+            # Без сигналов и ссылок на таблицу Django удаляет одним DELETE.
+            SimilarRecipe.objects.filter(recipe_id__in=block).delete()
+            SimilarRecipe.objects.bulk_create(rows)
+        total += len(rows)
+    return total
+
+
+def similar_scores(recipe_id):
+    """Сходство рецепта со всеми кандидатами, запросами к БД."""
+    ingredient_ids = list(
+        RecipeIngredient.objects
+        .filter(recipe_id=recipe_id)
+        .values_list('ingredient_id', flat=True))
+    tag_ids = list(
+        Recipe.tags.through.objects
+        .filter(recipe_id=recipe_id)
+        .values_list('tag_id', flat=True))
+    common = set(
+        RecipeIngredient.objects
+        .filter(ingredient_id__in=ingredient_ids)
+        .values('ingredient_id')
+        .annotate(recipes=Count('id'))
+        .filter(recipes__gt=settings.SIMILAR_RECIPES_COMMON_LIMIT)
+        .values_list('ingredient_id', flat=True))
+    shared = dict(
+        RecipeIngredient.objects
+        .filter(ingredient_id__in=set(ingredient_ids) - common)
+        .exclude(recipe_id=recipe_id)
+        .values('recipe_id')
+        .annotate(shared=Count('id'))
+        .values_list('recipe_id', 'shared'))
+    sizes = (
+        Recipe.objects
+        .filter(pk__in=shared)
+        .annotate(
+            ingredients_count=Count('recipeingredient', distinct=True),
+            tags_count=Count('tags', distinct=True),
+            shared_tags=Count('tags', filter=Q(tags__in=tag_ids),
+                              distinct=True))
+        .values_list('pk', 'ingredients_count', 'tags_count', 'shared_tags')
+    )
+    size = len(ingredient_ids) + len(tag_ids)
+    return {
+        pk: score(shared[pk] + shared_tags, size,
+                  ingredients_count + tags_count)
+        for pk, ingredients_count, tags_count, shared_tags in sizes
+    }
+
+
+def similar_rows(recipe_id, scores, limit):
+    return [
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other_id,
+                      score=similarity)
+        for similarity, other_id in heapq.nlargest(
+            limit, ((similarity, other_id)
+                    for other_id, similarity in scores.items()))
+    ]
+
+
+@transaction.atomic
+def update_similar_recipes(recipe_id):
+    """
+    Пересчитывает похожие после изменения ингредиентов или тегов
+    рецепта запросами к БД, без загрузки индекса. Сходство пары
+    зависит только от двух рецептов, поэтому рецепт занимает место
+    в списках кандидатов, где теперь входит в топ. В списках, где он
+    уже был, более высокая оценка просто записывается, а списки, где
+    она упала, пересчитываются целиком — не больше
+    SIMILAR_RECIPES_UPDATE_LIMIT. В остальных оценка обновляется
+    без пересчёта до следующего build_similar_recipes.
+    """
+    limit = settings.SIMILAR_RECIPES_COUNT
+    scores = similar_scores(recipe_id)
+    listed = dict(
+        SimilarRecipe.objects
+        .filter(similar_id=recipe_id)
+        .values_list('recipe_id', 'score'))
+    lowered = sorted(
+        other_id for other_id, similarity in listed.items()
+        if scores.get(other_id, 0) < similarity)
+    recount = set(lowered[:settings.SIMILAR_RECIPES_UPDATE_LIMIT])
+    SimilarRecipe.objects.filter(
+        Q(recipe_id__in=recount | {recipe_id}) | Q(similar_id=recipe_id)
+    ).delete()
+    rows = similar_rows(recipe_id, scores, limit)
+    for other_id in recount:
+        rows.extend(similar_rows(other_id, similar_scores(other_id), limit))
+    rows.extend(
+        SimilarRecipe(recipe_id=other_id, similar_id=recipe_id,
+                      score=scores[other_id])
+        for other_id in listed.keys() - recount if other_id in scores)
+    candidates = scores.keys() - listed.keys()
+    lists = defaultdict(list)
+    for pk, other_id, similarity, similar_id in (
+            SimilarRecipe.objects
+            .filter(recipe_id__in=candidates)
+            .values_list('pk', 'recipe_id', 'score', 'similar_id')):
+        lists[other_id].append((similarity, similar_id, pk))
+    displaced = []
+    for other_id in candidates:
+        entry = (scores[other_id], recipe_id)
+        entries = lists[other_id]
+        if len(entries) >= limit:
+            lowest = min(entries)
+            if entry < lowest[:2]:
+                continue
+            displaced.append(lowest[2])
+        rows.append(SimilarRecipe(
+            recipe_id=other_id, similar_id=recipe_id, score=entry[0]))
+    for start in range(0, len(displaced), DELETE_BATCH_SIZE):
+        SimilarRecipe.objects.filter(
+            pk__in=displaced[start:start + DELETE_BATCH_SIZE]).delete()
+    SimilarRecipe.objects.bulk_create(rows)
+
+
+def _run_in_worker(recipe_id):
+    close_old_connections()
+    try:
+        update_similar_recipes(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обновить похожие рецепты для %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_similar_recipes(recipe_id):
+    """
+    Ставит пересчёт похожих в очередь после коммита транзакции,
+    чтобы запрос не держал блокировки строк. Поток один: обновления
+    не перекрываются. Без SIMILAR_RECIPES_ASYNC пересчёт идёт сразу.
+    """
+
+    def submit():
+        global _executor
+        if not settings.SIMILAR_RECIPES_ASYNC:
+            update_similar_recipes(recipe_id)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='similar-recipes')
+        _executor.submit(_run_in_worker, recipe_id)
+
+    transaction.on_commit(submit)
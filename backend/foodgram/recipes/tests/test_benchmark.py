@@ -0,0 +1,54 @@
+from io import StringIO
+
+from api.tests.base import FoodgramTestCase
+from asgiref.sync import iscoroutinefunction
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import get_resolver
+from recipes.management.commands.benchmark import Command, get_urlconf
+from recipes.models import Recipe
+
+
+class BenchmarkContextTest(FoodgramTestCase):
+    """Замеры не трогают учётные записи, созданные не generate_data."""
+
+    def get_context(self):
+        command = Command()
+        command.prefix = 'bench'
+        return command.get_context()
+
+    def test_refuses_without_generated_users(self):
+        with self.assertRaises(CommandError):
+            self.get_context()
+
+    def test_uses_only_generated_users(self):
+        passwords = {user.pk: user.password for user in self.users}
+        call_command('generate_data', users=3, recipes=6, follows=1,
+                     favorites=1, carts=1, stdout=StringIO())
+        context = self.get_context()
+        for user in filter(None, (context['user'], context['author'],
+                                  context['unfollowed'],
+                                  context['recipe'].author)):
+            self.assertTrue(user.username.startswith('bench_'))
+        for user in self.users:
+            user.refresh_from_db()
+            self.assertEqual(user.password, passwords[user.pk])
+
+    def test_cursor_path(self):
+        ordering = ('-favorites_count', '-id')
+        for depth in (0, 4):
+            with self.subTest(depth=depth):
+                response = self.client.get(
+                    Command.get_cursor_path(ordering, depth))
+                self.assertEqual(
+                    [recipe['id'] for recipe in response.data['results']],
+                    list(Recipe.objects.order_by(*ordering).values_list(
+                        'pk', flat=True)[depth:depth + 6]))
+
+    def test_urlconf_ignores_async_views_setting(self):
+        for async_views in (False, True):
+            with self.subTest(async_views=async_views):
+                match = get_resolver(get_urlconf(async_views)).resolve(
+                    '/api/recipes/')
+                self.assertEqual(
+                    iscoroutinefunction(match.func), async_views)
@@ -0,0 +1,45 @@
+from api.tests.base import PNG, FoodgramTestCase
+from django.test import override_settings
+from recipes.feed import get_feed_page, pull_feed_page
+
+
+@override_settings(FEED_FANOUT_LIMIT=2)
+class FeedFanoutLimitTest(FoodgramTestCase):
+    """Лента совпадает с выборкой из рецептов при любом числе подписчиков."""
+    users_count = 5
+
+    def as_user(self, user):
+        self.client.force_authenticate(user)
+        return self.client
+
+    def subscribe(self, user, method='post'):
+        author = self.users[0]
+        response = getattr(self.as_user(user), method)(
+            f'/api/users/{author.pk}/subscribe/')
+        self.assertLess(response.status_code, 400)
+
+    def assert_feeds_complete(self):
+        for user in self.users[1:]:
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    get_feed_page(user, 100), pull_feed_page(user, 100))
+
+    def test_author_drops_below_limit(self):
+        for user in self.users[1:4]:
+            self.subscribe(user)
+        # Автор популярен: новый рецепт и подписка третьего
+        # читателя не раскладываются по лентам.
+        response = self.as_user(self.users[0]).post('/api/recipes/', {
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+            'tags': [self.tags[0].pk],
+            'image': PNG,
+            'name': 'Рецепт популярного автора',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assert_feeds_complete()
+        self.subscribe(self.users[1], 'delete')
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].followers_count, 2)
+        self.assert_feeds_complete()
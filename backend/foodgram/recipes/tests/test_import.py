@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from recipes.management.commands import import_csv
+from recipes.models import Ingredient
+
+ROWS = [
+    {'name': 'абрикосовое варенье', 'measurement_unit': 'г'},
+    {'name': 'соль', 'measurement_unit': 'щепотка'},
+    {'name': 'вода', 'measurement_unit': 'мл'},
+]
+
+
+class ImportIngredientsTest(TestCase):
+    """Импорт csv, json и JSON Lines без дублей и с проверкой строк."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_files(self, *paths, **options):
+        call_command('import_csv', *paths, stdout=StringIO(), **options)
+        return set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+
+    def get_files(self, rows):
+        return (
+            self.write('ingredients.csv', 'name,measurement_unit\n' + ''.join(
+                f'{row["name"]},{row["measurement_unit"]}\n'
+                for row in rows)),
+            self.write('ingredients.json', json.dumps(rows, indent=2)),
+            self.write('ingredients.jsonl', '\n'.join(map(json.dumps, rows))),
+        )
+
+    @mock.patch.object(import_csv, 'JSON_CHUNK_SIZE', 5)
+    def test_round_trip(self):
+        expected = {(row['name'], row['measurement_unit']) for row in ROWS}
+        for path in self.get_files(ROWS):
+            with self.subTest(path=os.path.basename(path)):
+                self.assertEqual(self.import_files(path, dry_run=True), set())
+                self.assertEqual(
+                    self.import_files(path, batch_size=2), expected)
+                self.assertEqual(self.import_files(path), expected)
+                Ingredient.objects.all().delete()
+
+    def test_rejects_empty_measurement_unit(self):
+        rows = [*ROWS, {'name': 'перец', 'measurement_unit': ' '}]
+        for path in self.get_files(rows):
+            with self.subTest(path=os.path.basename(path)):
+                with self.assertRaisesMessage(CommandError, 'запись 4'):
+                    self.import_files(path)
+                self.assertFalse(Ingredient.objects.exists())
+
+    def test_rejects_broken_json(self):
+        path = self.write('broken.json', json.dumps(ROWS)[:-1])
+        with self.assertRaisesMessage(CommandError, 'некорректный JSON'):
+            self.import_files(path)
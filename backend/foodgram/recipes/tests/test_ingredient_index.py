@@ -0,0 +1,77 @@
+import time
+from unittest import mock
+
+from api.tests.base import FoodgramTestCase
+from django.conf import settings
+from django.db.models import Count, F, Q
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Recipe, RecipeIngredient
+
+
+class IngredientIndexTest(FoodgramTestCase):
+    """Индекс отвечает так же, как GROUP BY по связям в БД."""
+    pantry = (0, 3, 4, 7)
+
+    def search_with_sql(self, ingredient_ids, limit):
+        return list(
+            Recipe.objects
+            .annotate(found=Count(
+                'recipeingredient',
+                filter=Q(recipeingredient__ingredient_id__in=ingredient_ids)))
+            .filter(found__gt=0)
+            .annotate(missing=Count('recipeingredient') - F('found'))
+            .order_by('missing', '-pk')
+            .values_list('pk', 'missing')[:limit])
+
+    def assert_same_as_sql(self):
+        ingredient_ids = [self.ingredients[number].pk
+                          for number in self.pantry]
+        self.assertEqual(
+            ingredient_index.search(ingredient_ids, 50),
+            self.search_with_sql(ingredient_ids, 50))
+
+    def test_changes_are_applied(self):
+        self.assert_same_as_sql()
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(recipe=self.recipes[0]).delete()
+            ingredient_index.update([self.recipes[0].pk])
+        self.assert_same_as_sql()
+        recipe = self.create_recipe(self.users[0], 40)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient_index.update([recipe.pk])
+        self.assert_same_as_sql()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[2].delete()
+        self.assert_same_as_sql()
+
+    @mock.patch('recipes.ingredient_index.close_old_connections')
+    @mock.patch('recipes.ingredient_index.threading.Thread')
+    def test_expired_index_is_rebuilt_in_background(self, thread, close):
+        ingredient_id = self.ingredients[0].pk
+        before = ingredient_index.search([ingredient_id], 50)
+        # Изменение из другого процесса: индекс этого о нём не знает.
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[5], ingredient=self.ingredients[0],
+            amount=1)
+        expired = time.monotonic() + settings.INGREDIENT_INDEX_TIMEOUT + 1
+        with mock.patch('recipes.ingredient_index.time.monotonic',
+                        return_value=expired):
+            self.assertEqual(
+                ingredient_index.search([ingredient_id], 50), before)
+            ingredient_index.search([ingredient_id], 50)
+        thread.assert_called_once()
+        load = ingredient_index._load
+
+        def load_and_delete():
+            # Рецепт удалён в этом процессе, пока шла пересборка.
+            try:
+                return load()
+            finally:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.recipes[1].delete()
+
+        with mock.patch.object(ingredient_index, '_load', load_and_delete):
+            thread.call_args.kwargs['target']()
+        self.assert_same_as_sql()
+        self.assertNotEqual(
+            ingredient_index.search([ingredient_id], 50), before)
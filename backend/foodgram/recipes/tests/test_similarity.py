@@ -0,0 +1,79 @@
+from unittest import mock
+
+from api.tests.base import PNG, FoodgramTestCase
+from django.test import override_settings
+from recipes import similarity
+from recipes.models import SimilarRecipe
+from recipes.similarity import build_similar_recipes
+
+
+@override_settings(SIMILAR_RECIPES_COUNT=3, SIMILAR_RECIPES_ASYNC=False,
+                   RECIPE_IMAGE_RENDITIONS_ASYNC=False)
+class SimilarRecipesTest(FoodgramTestCase):
+    """Запись через API оставляет ту же таблицу, что полный пересчёт."""
+    recipes_count = 20
+
+    def setUp(self):
+        super().setUp()
+        build_similar_recipes()
+        self.client.force_authenticate(self.users[0])
+
+    @staticmethod
+    def get_table():
+        return sorted(
+            SimilarRecipe.objects
+            .values_list('recipe_id', 'similar_id', 'score'))
+
+    def assert_same_as_full_build(self):
+        incremental = self.get_table()
+        build_similar_recipes()
+        self.assertEqual(incremental, self.get_table())
+
+    def patch(self, recipe, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def get_ingredients(self, numbers):
+        return [
+            {'id': self.ingredients[number].pk, 'amount': 1}
+            for number in numbers
+        ]
+
+    def test_update_ingredients(self):
+        recipe = self.recipes[0]
+        for numbers in ((0, 1, 2, 3, 4), (5,), (1, 6, 7), (8, 9)):
+            with self.subTest(numbers=numbers):
+                self.patch(
+                    recipe, {'ingredients': self.get_ingredients(numbers)})
+                self.assert_same_as_full_build()
+
+    def test_update_tags(self):
+        recipe = self.recipes[3]
+        self.patch(recipe, {'tags': [tag.pk for tag in self.tags]})
+        self.assert_same_as_full_build()
+
+    @override_settings(SIMILAR_RECIPES_UPDATE_LIMIT=0)
+    def test_update_limit(self):
+        recipe = self.recipes[0]
+        self.patch(recipe, {'ingredients': self.get_ingredients((8, 9))})
+        own = SimilarRecipe.objects.filter(recipe=recipe)
+        incremental = sorted(own.values_list('similar_id', 'score'))
+        build_similar_recipes()
+        self.assertEqual(
+            incremental, sorted(own.values_list('similar_id', 'score')))
+
+    @mock.patch.object(similarity, 'DELETE_BATCH_SIZE', 1)
+    def test_create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', {
+                'ingredients': self.get_ingredients((2, 4, 6, 8)),
+                'tags': [self.tags[1].pk],
+                'image': PNG,
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assert_same_as_full_build()
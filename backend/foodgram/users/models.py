@@ -26,6 +26,12 @@ class User(AbstractUser):
         verbose_name='Фамилия'
     )
 
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 